@@ -1,61 +1,211 @@
 import pandas as pd
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from PIL import Image, ImageTk
+from PIL import ImageTk
 import os
 import threading
-import datetime
-
-# Calculate Hamming distance between two hashes
-def hamming_distance(s1, s2):
-    return sum(c1 != c2 for c1, c2 in zip(s1, s2))
+import time
+from concurrent.futures import ThreadPoolExecutor
+from hashindex import HashIndex
+from thumbcache import ThumbnailCache
+from previewloader import PreviewLoader
+from hashcache import HashCache
+from imagemeta import METADATA_COLUMNS, UNREADABLE, image_metadata
+from csvstream import read_frames
+from hashstore import HashStore, is_store
+from treemodel import TreeModel
+from searchindex import SearchIndex
+from dupcluster import save_clusters_csv
+from hashjobs import duplicate_groups, similar_images
+from stats import Stats
+from statspanel import StatsPanel
 
 def load_csv():
-    filepath = filedialog.askopenfilename(title="Select CSV File", filetypes=(("CSV files", "*.csv"), ("All files", "*.*")))
+    global data, hash_index, search_index, load_generation, stats, expected_rows
+    filepath = filedialog.askopenfilename(title="Select CSV File", filetypes=(("CSV files", "*.csv"), ("Hash stores", "*.hashstore"), ("All files", "*.*")))
     if not filepath:
         return
 
-    threading.Thread(target=populate_data, args=(filepath,)).start()
-
-
-
-
-def populate_data(filepath):
-    global data
-    data = pd.read_csv(filepath)
-
-    tree.delete(*tree.get_children())
-    for index, row in data.iterrows():
-        image_path = row[0]
-        img = Image.open(image_path)
-        creation_time = datetime.datetime.fromtimestamp(os.path.getctime(image_path)).strftime('%Y-%m-%d %H:%M:%S')
-        modification_time = datetime.datetime.fromtimestamp(os.path.getmtime(image_path)).strftime('%Y-%m-%d %H:%M:%S')
-        tree.insert("", "end", values=(image_path, 
-                                       img.format, 
-                                       f"{img.width}x{img.height} {img.mode}", 
-                                       f"{os.path.getsize(image_path)} bytes", 
-                                       creation_time,
-                                       modification_time,
-                                       row[1], row[2], row[3], row[4], row[5]))
+    data = None
+    hash_index = None
+    search_index = None
+    load_generation += 1
+    # Every loaded file gets fresh counters; queries on it are recorded into the same Stats
+    stats = Stats()
+    expected_rows = None
+    stats_panel.watch(stats, "rows", lambda: expected_rows)
+    tree_model.clear()
+    instructions.config(text="Loading...")
+    threading.Thread(target=populate_data, args=(filepath, load_generation, stats), daemon=True).start()
+
+def populate_data(filepath, generation, stats):
+    global data, hash_index, csv_path
+    # Every column is text: hex hashes must not be parsed as numbers.
+    # Rows reach the Treeview chunk by chunk through the main loop, with the
+    # file metadata columns left empty until the row is shown or sorted on
+    if is_store(filepath):
+        # Binary stores are memory-mapped; only the rows being shown are turned into text
+        store = HashStore(filepath)
+        frames = ((chunk, chunk.index[-1] + 1, store.size) for chunk in store.iter_frames(CSV_CHUNK_ROWS))
+    else:
+        store = None
+        frames = read_frames(filepath, CSV_CHUNK_ROWS, dtype=str, keep_default_na=False)
+    chunks = []
+    started = time.perf_counter()
+    for chunk, done, total in frames:
+        stats.record("load.read", time.perf_counter() - started)
+        if generation != load_generation:
+            return
+        chunks.append(chunk)
+        root.after(0, insert_rows, chunk, generation, done / max(1, total))
+        started = time.perf_counter()
+    if chunks:
+        frame = pd.concat(chunks)
+    elif store is not None:
+        frame = pd.DataFrame(columns=["Image"] + store.names, dtype=str)
+    else:
+        frame = pd.read_csv(filepath, dtype=str, keep_default_na=False)
+
+    # Pack the hash columns once so lookups never have to read the Treeview;
+    # the multi-index tables are cached next to the file for the next session
+    with stats.timer("index.build"):
+        if store is not None:
+            index = HashIndex.open_for_store(store)
+        else:
+            index = HashIndex.open_for_csv(filepath, frame)
+    with stats.timer("search.build"):
+        searcher = SearchIndex(frame.iloc[:, 0].tolist(),
+                               [frame.iloc[:, c].tolist() for c in range(1, frame.shape[1])])
+    root.after(0, finish_loading, filepath, frame, index, searcher, generation)
+
+def insert_rows(chunk, generation, fraction):
+    global expected_rows
+    if generation != load_generation:
+        return
+    instructions.config(text=f"Loading... {fraction:.0%}")
+    blank = ("",) * len(METADATA_COLUMNS)
+    with stats.timer("load.insert"):
+        for index, values in zip(chunk.index, chunk.itertuples(index=False)):
+            tree_model.insert((values[0], *blank, *values[1:6]), iid=str(index))
+    stats.count("rows", len(chunk))
+    # The total row count is only known at the end; estimate it from the fraction of the file read
+    expected_rows = int(stats.counters["rows"] / max(fraction, 1e-9))
+    schedule_metadata(tree)
+
+def finish_loading(filepath, frame, index, searcher, generation):
+    global data, hash_index, search_index, csv_path, expected_rows
+    if generation != load_generation:
+        return
+    data, hash_index, search_index, csv_path = frame, index, searcher, filepath
+    expected_rows = len(data)
+    stats.dump(profile_path(), rows=len(data))
+    update_matches()
+    cluster_column_box.config(values=["All"] + hash_index.names)
+    if cluster_column_box.get() not in cluster_column_box.cget("values"):
+        cluster_column_box.current(0)
+    instructions.config(text=f"Loaded {len(data)} rows")
+
+def profile_path():
+    # Load timings, then query timings at exit, are written next to the loaded file
+    return csv_path + ".profile.json"
+
+def visible_items(treeview):
+    # The first row sits just below the heading; bbox is empty once rows scroll out of view
+    item = ""
+    for y in range(0, 60, 4):
+        item = treeview.identify_row(y)
+        if item:
+            break
+    items = []
+    while item and treeview.bbox(item):
+        items.append(item)
+        item = treeview.next(item)
+    return items
+
+def schedule_metadata(treeview):
+    # Scrolling and batch inserts fire many times a second; only act once things settle
+    job = metadata_jobs.pop(str(treeview), None)
+    if job is not None:
+        root.after_cancel(job)
+    metadata_jobs[str(treeview)] = root.after(50, run_scheduled_metadata, treeview)
+
+def run_scheduled_metadata(treeview):
+    metadata_jobs.pop(str(treeview), None)
+    request_metadata(treeview)
+
+def request_metadata(treeview, items=None, then=None):
+    """Fill the metadata columns of items (by default the visible rows) from a worker thread"""
+    if items is None:
+        items = visible_items(treeview)
+    items = [item for item in items if not treeview.set(item, "Type")]
+    if then is None:
+        items = [item for item in items if (str(treeview), item) not in metadata_pending]
+    if not items:
+        if then is not None:
+            then()
+        return
+    metadata_pending.update((str(treeview), item) for item in items)
+    paths = [treeview.set(item, "Image Path") for item in items]
+    future = metadata_executor.submit(read_metadata, paths, stats)
+    future.add_done_callback(lambda f: root.after(0, apply_metadata, treeview, items, paths, f.result(), then))
+
+def read_metadata(paths, stats):
+    # Never raise: the done-callback must always reach apply_metadata, or the rows stay pending
+    results = []
+    with stats.timer("metadata.read"):
+        for path in paths:
+            try:
+                results.append(image_metadata(path, info_cache))
+            except Exception as e:
+                print(f"Error reading {path}: {e}")
+                results.append(UNREADABLE)
+    return results
+
+def apply_metadata(treeview, items, paths, results, then):
+    for item, path, values in zip(items, paths, results):
+        metadata_pending.discard((str(treeview), item))
+        # Rows may have been replaced by another CSV in the meantime
+        if treeview.exists(item) and treeview.set(item, "Image Path") == path:
+            for column, value in zip(METADATA_COLUMNS, values):
+                model_for(treeview).set(item, column, value)
+    if then is not None:
+        then()
+
+def model_for(treeview):
+    return tree_model if treeview == tree else detail_model
+
+def on_tree_scroll(treeview, scrollbar):
+    def update(first, last):
+        scrollbar.set(first, last)
+        schedule_metadata(treeview)
+    return update
 
 def on_item_selected(event):
-    for treeview in [tree, detail_tree]:
-        if treeview.selection():
-            item = treeview.selection()[0]
-            image_path = treeview.item(item, "values")[0]
-            
-            img = Image.open(image_path)
-            max_size = 600
-            scale = min(max_size/img.width, max_size/img.height)
-            img = img.resize((int(img.width*scale), int(img.height*scale)))
-            img = ImageTk.PhotoImage(img)
-            
-            if treeview == tree:
-                preview_label1.config(image=img)
-                preview_label1.image = img
-            else:
-                preview_label2.config(image=img)
-                preview_label2.image = img
+    treeview = event.widget
+    if not treeview.selection():
+        return
+    item = treeview.selection()[0]
+    image_path = treeview.item(item, "values")[0]
+    label = preview_label1 if treeview == tree else preview_label2
+
+    # Decoding happens on the loader's workers, so holding an arrow key never blocks the UI
+    preview_loader.request(label, image_path, lambda img: show_preview(label, img))
+    preview_loader.prefetch(neighbour_paths(treeview, item, PREFETCH_ROWS))
+
+def show_preview(label, img):
+    img = ImageTk.PhotoImage(img)
+    label.config(image=img)
+    label.image = img
+
+def neighbour_paths(treeview, item, count):
+    # Image paths of the rows just below and above item, nearest first
+    paths = []
+    after, before = item, item
+    for _ in range(count):
+        after = after and treeview.next(after)
+        before = before and treeview.prev(before)
+        paths.extend(treeview.item(row, "values")[0] for row in (after, before) if row)
+    return paths
 
 def on_hash_clicked(event):
     clicked_column = tree.identify_column(event.x)
@@ -66,41 +216,154 @@ def on_hash_clicked(event):
     if col_index < 7:
         return
 
-    hash_value = tree.item(tree.selection()[0], "values")[col_index-1]
-    
-    distances = []
-    for child in tree.get_children():
-        distance = hamming_distance(tree.item(child, "values")[col_index-1], hash_value)
-        distances.append((distance, tree.item(child, "values")))
+    # Button-1 fires before the selection changes, so use the row under the cursor
+    item = tree.identify_row(event.y) or (tree.selection() or [None])[0]
+    if item is None or hash_index is None:
+        return
 
-    distances.sort(key=lambda x: x[0])
-    similar_items = distances[:20]
+    hash_column = col_index - 7
+    if hash_column >= len(hash_index.packed):
+        return
 
-    detail_tree.delete(*detail_tree.get_children())
-    for distance, values in similar_items:
-        detail_tree.insert("", "end", values=values)
+    row = data.index.get_loc(int(item))
+    # Weighted score over every hash column instead of just the clicked one when combining
+    combined = combine_var.get()
+    with stats.timer("query.combined" if combined else "query.nearest"):
+        similar_items = similar_images(hash_index, row, None if combined else hash_column, k=20)
+    if combined and similar_items:
+        instructions.config(text=f"Combined scores {similar_items[0][0]:.3f} - {similar_items[-1][0]:.3f}")
+
+    with stats.timer("ui.results"):
+        detail_model.clear()
+        for distance, row in similar_items:
+            detail_model.insert(tree_model.rows[str(data.index[row])])
+    schedule_metadata(detail_tree)
+
+def find_duplicates():
+    if hash_index is None:
+        return
+    try:
+        threshold = int(cluster_threshold_var.get())
+    except ValueError:
+        messagebox.showerror("Find Duplicates", "Threshold must be an integer")
+        return
+    choice = cluster_column_box.get()
+    columns = list(range(len(hash_index.names))) if choice == "All" else [hash_index.names.index(choice)]
+    instructions.config(text="Clustering...")
+    # The worker gets the loaded file's state, so loading another file meanwhile cannot mix the two
+    threading.Thread(target=cluster_data, args=(columns, threshold, load_generation, hash_index, data, csv_path,
+                                                stats)).start()
+
+def cluster_data(columns, threshold, generation, index, frame, filepath, stats):
+    # Whole-collection near-duplicate groups; results go back to Tk on the main thread
+    try:
+        with stats.timer("query.cluster"):
+            groups, packed = duplicate_groups(index, columns, threshold)
+        output_path = os.path.splitext(filepath)[0] + "_clusters.csv"
+        save_clusters_csv(output_path, groups, frame, packed)
+    except Exception as e:
+        root.after(0, clustering_failed, generation, e)
+        return
+    root.after(0, show_clusters, groups, output_path, frame, generation)
 
-def treeview_sort_column(tv, col, reverse):
-    l = [(tv.set(k, col), k) for k in tv.get_children('')]
-    l.sort(reverse=reverse)
+def clustering_failed(generation, error):
+    if generation != load_generation:
+        return
+    instructions.config(text="Clustering failed")
+    messagebox.showerror("Find Duplicates", str(error))
+
+def show_clusters(groups, output_path, frame, generation):
+    # Groups from a file that has since been replaced are dropped
+    if generation != load_generation:
+        return
+    detail_model.clear()
+    for cluster, group in enumerate(groups):
+        tag = "cluster_odd" if cluster % 2 else "cluster_even"
+        for row in group:
+            detail_model.insert(tree_model.rows[str(frame.index[row])], tags=(tag,))
+    schedule_metadata(detail_tree)
+    instructions.config(text=f"{len(groups)} duplicate groups saved to {output_path}")
 
-    for index, (val, k) in enumerate(l):
-        tv.move(k, '', index)
+def treeview_sort_column(tv, col, reverse):
+    if col in METADATA_COLUMNS:
+        # Metadata is only read for rows that were shown, so fetch the rest first
+        missing = [k for k, values in model_for(tv).rows.items() if not values[1]]
+        if missing:
+            instructions.config(text=f"Reading {len(missing)} files to sort by {col}...")
+            request_metadata(tv, missing, then=lambda: treeview_sort_column(tv, col, reverse))
+            return
+    # Sizes, dimensions, times and hashes sort by value, not as text
+    with stats.timer("ui.sort"):
+        model_for(tv).sort(col, reverse)
 
     tv.heading(col, command=lambda: treeview_sort_column(tv, col, not reverse))
     
 # Search Function
-def search():
-    search_term = search_var.get().lower()
-    for item in tree.get_children():
-        values = tree.item(item, "values")
-        if any(search_term in str(val).lower() for val in values):
-            tree.selection_set(item)
-            tree.see(item)
-            break
+def update_matches():
+    # Path substrings and hash prefixes both come from the index built at load time
+    global search_matches, search_position, search_term
+    search_term = search_var.get()
+    if search_index is not None and search_term.strip():
+        with stats.timer("search.query"):
+            search_matches = search_index.search(search_term)
+    else:
+        search_matches = []
+    search_position = -1
+    match_label.config(text=f"{len(search_matches)} matches" if search_term.strip() else "")
+
+def search(step=1):
+    """Select the next (step=1) or previous (step=-1) row matching the search box"""
+    global search_position
+    if search_var.get() != search_term:
+        update_matches()
+    if len(search_matches) == 0:
+        return
+    search_position = (search_position + step) % len(search_matches)
+    item = str(data.index[search_matches[search_position]])
+    tree.selection_set(item)
+    tree.focus(item)
+    tree.see(item)
+    match_label.config(text=f"{search_position + 1}/{len(search_matches)}")
+
+def on_search_typed(event):
+    # Search as you type, once typing pauses
+    global search_job
+    if search_job is not None:
+        root.after_cancel(search_job)
+    search_job = root.after(150, search_as_typed)
+
+def search_as_typed():
+    global search_job
+    search_job = None
+    if search_var.get() != search_term:
+        update_matches()
+        search(1)
+
+data = None
+hash_index = None
+search_index = None
+search_matches = []
+search_position = -1
+search_term = ""
+search_job = None
+csv_path = None
+stats = Stats()
+expected_rows = None
+thumb_cache = ThumbnailCache()
+# Image format and size come from the shared cache; only new or changed files are opened
+info_cache = HashCache()
+metadata_executor = ThreadPoolExecutor(max_workers=4)
+metadata_pending = set()
+metadata_jobs = {}
+load_generation = 0
+CSV_CHUNK_ROWS = 2000
+# Rows above and below the selection whose previews are decoded ahead of time
+PREFETCH_ROWS = 3
+
 root = tk.Tk()
 root.title("Find Similar Images")
 root.geometry("1600x1000")
+preview_loader = PreviewLoader(root, thumb_cache, (600, 600))
 
 frame0 = ttk.Frame(root, padding="10")
 frame1 = ttk.Frame(root, padding="10")
@@ -110,18 +373,19 @@ frame3 = ttk.Frame(root, padding="10")
 # Search Entry
 search_var = tk.StringVar()
 def on_search():
-    search_term = search_var.get()
-    # Highlight and select the matching item
-    for child in tree.get_children():
-        if search_term in tree.item(child, "values")[0] or search_term in tree.item(child, "values")[6:]:  # filename or hash value
-            tree.selection_set(child)
-            tree.focus(child)
-            break
+    search(1)
 # Search Button
 search_entry = ttk.Entry(frame0, textvariable=search_var)
 search_entry.pack(side="left", padx=5)
+search_entry.bind("<KeyRelease>", on_search_typed)
+search_entry.bind("<Return>", lambda event: search(1))
+search_entry.bind("<Shift-Return>", lambda event: search(-1))
 search_btn = ttk.Button(frame0, text="Search", command=on_search)
 search_btn.pack(side="left", padx=5)
+ttk.Button(frame0, text="Previous", command=lambda: search(-1)).pack(side="left")
+ttk.Button(frame0, text="Next", command=lambda: search(1)).pack(side="left", padx=5)
+match_label = ttk.Label(frame0, width=16)
+match_label.pack(side="left", padx=5)
 
 # Instructions
 instructions = ttk.Label(frame0, text="Load the CSV and then select a hash from the table above")
@@ -131,6 +395,20 @@ instructions.pack(side="left", padx=5)
 load_btn = ttk.Button(frame0, text="Load CSV", command=load_csv)
 load_btn.pack(side="left", padx=5)
 
+# Duplicate clustering over one hash column or all of them combined
+cluster_column_box = ttk.Combobox(frame0, values=["All"], width=18, state="readonly")
+cluster_column_box.current(0)
+cluster_column_box.pack(side="left", padx=5)
+ttk.Label(frame0, text="Max distance").pack(side="left")
+cluster_threshold_var = tk.StringVar(value="6")
+ttk.Entry(frame0, textvariable=cluster_threshold_var, width=5).pack(side="left", padx=5)
+cluster_btn = ttk.Button(frame0, text="Find Duplicates", command=find_duplicates)
+cluster_btn.pack(side="left", padx=5)
+
+# Rank by all hashes together when a hash cell is clicked
+combine_var = tk.BooleanVar(value=False)
+ttk.Checkbutton(frame0, text="Combine hashes", variable=combine_var).pack(side="left", padx=5)
+
 frame0.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
 frame1.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
 frame2.grid(row=2, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
@@ -150,6 +428,7 @@ tree = ttk.Treeview(frame1, columns=columns, show="headings")
 for i, col in enumerate(columns):
     tree.column(col, width=column_widths[i])
     tree.heading(col, text=col, command=lambda _col=col: treeview_sort_column(tree, _col, False))
+tree_model = TreeModel(tree, columns)
 tree.bind("<<TreeviewSelect>>", on_item_selected)
 tree.bind("<Button-1>", on_hash_clicked)
 
@@ -160,7 +439,7 @@ tree.bind("<Button-1>", on_hash_clicked)
 # Vertical Scrollbar
 scrollbar1_v = ttk.Scrollbar(frame1, orient="vertical", command=tree.yview)
 scrollbar1_v.pack(side="right", fill="y")
-tree.configure(yscrollcommand=scrollbar1_v.set)
+tree.configure(yscrollcommand=on_tree_scroll(tree, scrollbar1_v))
 
 # Horizontal Scrollbar
 scrollbar1_h = ttk.Scrollbar(frame1, orient="horizontal", command=tree.xview)
@@ -179,6 +458,10 @@ preview_label1.pack(side="left", padx=10)
 preview_label2 = ttk.Label(preview_frame)
 preview_label2.pack(side="left", padx=10)
 
+# Live load speed and per-stage timings (load, index build, queries)
+stats_panel = StatsPanel(preview_frame, unit="rows")
+stats_panel.pack(side="left", padx=10, anchor="n")
+
 detail_tree = ttk.Treeview(frame3, columns=columns, show="headings")
 # Setting treeview width to match window width minus scrollbar width
 # treeview_width = 1200 - 20  # 20 pixels for scrollbar width
@@ -188,7 +471,9 @@ detail_tree = ttk.Treeview(frame3, columns=columns, show="headings")
 for i, col in enumerate(columns):
     detail_tree.column(col, width=column_widths[i])
     detail_tree.heading(col, text=col, command=lambda _col=col: treeview_sort_column(detail_tree, _col, False))
+detail_model = TreeModel(detail_tree, columns)
 detail_tree.bind("<<TreeviewSelect>>", on_item_selected)
+detail_tree.tag_configure("cluster_odd", background="#e8eef7")
 
 # Adding scrollbar inside the detail_treeview
 #scrollbar2 = ttk.Scrollbar(detail_tree, orient="vertical", command=detail_tree.yview)
@@ -199,7 +484,7 @@ detail_tree.bind("<<TreeviewSelect>>", on_item_selected)
 # Vertical Scrollbar
 scrollbar2_v = ttk.Scrollbar(frame3, orient="vertical", command=detail_tree.yview)
 scrollbar2_v.pack(side="right", fill="y")
-detail_tree.configure(yscrollcommand=scrollbar2_v.set)
+detail_tree.configure(yscrollcommand=on_tree_scroll(detail_tree, scrollbar2_v))
 
 # Horizontal Scrollbar
 scrollbar2_h = ttk.Scrollbar(frame3, orient="horizontal", command=detail_tree.xview)
@@ -220,4 +505,7 @@ preview_frame.master = frame2
 # Move the detail_tree to frame3
 detail_tree.master = frame3
 
-root.mainloop()
\ No newline at end of file
+root.mainloop()
+info_cache.commit()
+if csv_path is not None:
+    stats.dump(profile_path(), rows=len(data) if data is not None else 0)
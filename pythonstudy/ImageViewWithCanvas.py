@@ -2,116 +2,203 @@ import tkinter as tk
 from tkinter import filedialog
 from PIL import Image, ImageTk
 import csv
-import os
+from itertools import zip_longest
+from thumbcache import ThumbnailCache
+from previewloader import PreviewLoader
+
+thumb_cache = ThumbnailCache()
+
+ROW_HEIGHT = 304  # 300 px image canvas plus borders
+IMAGE_BOX = (10**9, 300)
+SCROLL_UNIT = 60  # Pixels per scroll step
+EXTRA_ROWS = 1  # Row widgets kept beyond what fits in the viewport
+PREFETCH_ROWS = 3  # Rows above and below the viewport whose images are decoded ahead
 
 class CustomRow:
-    def __init__(self, parent, row_num, row_data, headers=False):
-        self.parent = parent
-        self.widgets = []
-        self.row_data = row_data
-
-        checkbtn = tk.Checkbutton(self.parent)
-        checkbtn.grid(row=row_num, column=0, sticky="nsew")
-        self.widgets.append(checkbtn)
-
-        for col_idx, item in enumerate(row_data):
-            if headers:
-                label = tk.Label(self.parent, text=item, borderwidth=1, relief="solid", width=75)  # Set width to 75 to roughly equal 600px
-                label.grid(row=row_num, column=col_idx+1, sticky="nsew")
-                label.bind("<Button-1>", lambda event, idx=col_idx: parent.sort_by_column(idx))
-                self.widgets.append(label)
-            elif col_idx == 0:
-                canvas = tk.Canvas(self.parent, width=600, height=300, bg='gray')
-                canvas.grid(row=row_num, column=col_idx+1, sticky="nsew")
-                canvas.bind("<Button-1>", self.open_image)
-                self.load_image(item, canvas)
-                self.widgets.append(canvas)
-            else:
-                label = tk.Label(self.parent, text=item, borderwidth=1, relief="solid", width=25)
-                label.grid(row=row_num, column=col_idx+1, sticky="nsew")
-                self.widgets.append(label)
+    """One reusable table row; show() rebinds it to whichever data row is scrolled into its place"""
+    def __init__(self, table, n_columns):
+        self.table = table
+        self.index = None
+        self.image_path = ""
+        self.frame = tk.Frame(table.canvas)
+
+        self.checked = tk.IntVar()
+        checkbtn = tk.Checkbutton(self.frame, variable=self.checked, command=self.on_check)
+        checkbtn.grid(row=0, column=0, sticky="nsew")
+
+        self.image_canvas = tk.Canvas(self.frame, width=600, height=300, bg='gray')
+        self.image_canvas.grid(row=0, column=1, sticky="nsew")
+        self.image_canvas.bind("<Button-1>", self.open_image)
+
+        self.labels = []
+        for col_idx in range(1, n_columns):
+            label = tk.Label(self.frame, borderwidth=1, relief="solid", width=25)
+            label.grid(row=0, column=col_idx+1, sticky="nsew")
+            self.labels.append(label)
 
-    def load_image(self, image_path, canvas):
-        if not image_path.strip() or not os.path.exists(image_path):
+        self.window = table.canvas.create_window(0, 0, window=self.frame, anchor="nw")
+
+    def show(self, index, y):
+        self.table.canvas.coords(self.window, 0, y)
+        self.table.canvas.itemconfigure(self.window, state="normal")
+        if index == self.index:
+            return
+        self.index = index
+        row_data = self.table.data[index]
+        self.checked.set(index in self.table.checked)
+        for label, item in zip_longest(self.labels, row_data[1:len(self.labels)+1], fillvalue=""):
+            label.config(text=item)
+        self.load_image(row_data[0] if row_data else "")
+
+    def hide(self):
+        self.index = None
+        self.table.loader.cancel(self)
+        self.table.canvas.itemconfigure(self.window, state="hidden")
+
+    def load_image(self, image_path):
+        self.image_path = image_path
+        self.image_canvas.delete("all")
+        self.image_canvas.image = None
+        if not image_path.strip():
+            self.table.loader.cancel(self)
             return
+        # Placeholder until the worker pool has the thumbnail; a rebind cancels the old request
+        self.image_canvas.create_text(300, 150, text="Loading...", fill="white")
+        self.table.loader.request(self, image_path, self.show_image)
 
-        try:
-            image = Image.open(image_path)
-            width, height = image.size
-            new_height = 300
-            new_width = int((new_height/height) * width)
-            image = image.resize((new_width, new_height), Image.ANTIALIAS)
-            photo = ImageTk.PhotoImage(image)
-            canvas.create_image(0, 0, anchor=tk.NW, image=photo)
-            canvas.image = photo
-        except Exception as e:
-            print(f"Error loading image: {e}")
+    def show_image(self, image):
+        photo = ImageTk.PhotoImage(image)
+        self.image_canvas.delete("all")
+        self.image_canvas.create_image(0, 0, anchor=tk.NW, image=photo)
+        self.image_canvas.image = photo
+
+    def on_check(self):
+        if self.checked.get():
+            self.table.checked.add(self.index)
+        else:
+            self.table.checked.discard(self.index)
 
     def open_image(self, event):
-        col_idx = self.widgets.index(event.widget)
-        image_path = self.row_data[col_idx]
-        if image_path.strip():
-            image = Image.open(image_path)
+        if self.image_path.strip():
+            image = Image.open(self.image_path)
             image.show()
 
+    def destroy(self):
+        self.table.loader.cancel(self)
+        self.table.canvas.delete(self.window)
+        self.frame.destroy()
+
 class CustomTable:
+    """Virtual table: data stays in a list and only enough row widgets to fill the view exist"""
     def __init__(self, parent):
         self.parent = parent
-        self.canvas = tk.Canvas(self.parent)
-        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        self.canvas.bind("<MouseWheel>", self._on_mousewheel)
-        self.vscrollbar = tk.Scrollbar(self.parent, orient=tk.VERTICAL, command=self.canvas.yview)
-        self.canvas.configure(yscrollcommand=self.vscrollbar.set)
+        self.data = []  # CSV rows, never reordered
+        self.order = []  # Data row index shown at each position
+        self.checked = set()  # Data row indexes whose checkbox is ticked
+        self.rows = []
+        self.offset = 0  # Pixels scrolled from the top
+        self.sort_column = None
+        self.sort_reverse = False
+        self.loader = PreviewLoader(parent, thumb_cache, IMAGE_BOX)
+
+        self.header_frame = tk.Frame(self.parent)
+        self.header_frame.pack(side=tk.TOP, fill=tk.X)
+        self.vscrollbar = tk.Scrollbar(self.parent, orient=tk.VERTICAL, command=self.yview)
         self.vscrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas = tk.Canvas(self.parent, highlightthickness=0)
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.canvas.bind("<Configure>", lambda event: self.refresh())
+        self.canvas.bind_all("<MouseWheel>", self._on_mousewheel)
+        self.canvas.bind_all("<Button-4>", lambda event: self.scroll_by(-SCROLL_UNIT))
+        self.canvas.bind_all("<Button-5>", lambda event: self.scroll_by(SCROLL_UNIT))
+
+        # Modify this list as per your CSV columns; load_csv takes them from the CSV header
+        self.set_headers(["Image", "Hash1", "Hash2", "Hash3", "Hash4", "Hash5"])
 
-        self.grid_frame = tk.Frame(self.canvas)
-        self.canvas.create_window((0, 0), window=self.grid_frame, anchor="nw")
+    def set_headers(self, headers):
+        for widget in self.header_frame.winfo_children():
+            widget.destroy()
+        for row in self.rows:
+            row.destroy()
+        self.rows = []
+        self.headers = headers
 
-        self.grid_frame.bind("<Configure>", self.on_frame_configure)
+        tk.Label(self.header_frame, width=2).grid(row=0, column=0, sticky="nsew")
+        for col_idx, item in enumerate(headers):
+            width = 75 if col_idx == 0 else 25  # 75 roughly equals the 600px image column
+            label = tk.Label(self.header_frame, text=item, borderwidth=1, relief="solid", width=width)
+            label.grid(row=0, column=col_idx+1, sticky="nsew")
+            label.bind("<Button-1>", lambda event, idx=col_idx: self.sort_by_column(idx))
 
-        self.row = 0  # Keep track of the current row number
-        # Add table headers
-        headers = ["Image", "Hash1", "Hash2", "Hash3", "Hash4", "Hash5"]  # Modify this list as per your CSV columns
-        self.header_row = CustomRow(self.grid_frame, 0, headers)
-        # Add placeholder rows
-        for _ in range(5):  # Let's add 5 placeholder rows for now
-            self.add_row([''] * 6)  # Assuming 6 columns
-            
     def sort_by_column(self, col_idx):
-        # Sort data based on the column index and re-populate the table
-        self.data.sort(key=lambda x: x[col_idx])
-        for widget in self.grid_frame.winfo_children():
-            widget.destroy()
-        self.header_row = CustomRow(self.grid_frame, 0, headers, headers=True)
-        self.row = 1
-        for row_data in self.data:
-            self.add_row(row_data)
-            
-    def on_frame_configure(self, event):
-        self.canvas.configure(scrollregion=self.canvas.bbox("all"))
-        
+        # Only the order of the model changes; the visible row widgets are simply rebound
+        reverse = not self.sort_reverse if col_idx == self.sort_column else False
+        self.order.sort(key=lambda i: self.data[i][col_idx] if col_idx < len(self.data[i]) else "",
+                        reverse=reverse)
+        self.sort_column, self.sort_reverse = col_idx, reverse
+        self.refresh()
+
+    def refresh(self):
+        height = self.canvas.winfo_height()
+        total = len(self.order) * ROW_HEIGHT
+        self.offset = max(0, min(self.offset, total - height))
+
+        needed = min(len(self.order), height // ROW_HEIGHT + 1 + EXTRA_ROWS)
+        while len(self.rows) < needed:
+            self.rows.append(CustomRow(self, len(self.headers)))
+
+        # Position p always uses widget p % len(rows), so scrolling one row rebinds one widget
+        first = self.offset // ROW_HEIGHT
+        for position in range(first, first + len(self.rows)):
+            row = self.rows[position % len(self.rows)]
+            if position < len(self.order):
+                row.show(self.order[position], position * ROW_HEIGHT - self.offset)
+            else:
+                row.hide()
+
+        if total:
+            self.vscrollbar.set(self.offset / total, min(1.0, (self.offset + height) / total))
+        else:
+            self.vscrollbar.set(0.0, 1.0)
+
+        ahead = range(first + len(self.rows), min(len(self.order), first + len(self.rows) + PREFETCH_ROWS))
+        behind = range(max(0, first - PREFETCH_ROWS), first)
+        paths = [self.data[self.order[p]][0] for p in [*ahead, *reversed(behind)] if self.data[self.order[p]]]
+        self.loader.prefetch([path for path in paths if path.strip()])
+
+    def yview(self, *args):
+        total = len(self.order) * ROW_HEIGHT
+        if args[0] == "moveto":
+            self.offset = int(float(args[1]) * total)
+        elif args[0] == "scroll":
+            step = self.canvas.winfo_height() if args[2] == "pages" else SCROLL_UNIT
+            self.offset += int(args[1]) * step
+        self.refresh()
+
+    def scroll_by(self, pixels):
+        self.offset += pixels
+        self.refresh()
+
     def _on_mousewheel(self, event):
-        self.canvas.yview_scroll(-1*(event.delta//120), "units")
-        
-    def add_row(self, row_data):
-        CustomRow(self.grid_frame, self.row, row_data)
-        self.row += 1
+        self.scroll_by(-1*(event.delta//120) * SCROLL_UNIT)
 
     def load_csv(self, file_path):
-        # Clear all rows before adding new ones
-        for widget in self.grid_frame.winfo_children():
-            widget.destroy()
+        with open(file_path, 'r', newline='', encoding='utf-8') as file:
+            self.data = [row for row in csv.reader(file) if row]
+        # hashes.csv starts with a header row; file lists and hashed lists (imageHashes3, shards) do not
+        if self.data and self.data[0][0] == "Image":
+            headers = self.data.pop(0)
+        else:
+            width = max((len(row) for row in self.data), default=1)
+            headers = ["Image"] + [f"Column {i}" for i in range(1, width)]
 
-        # Add table headers again after clearing
-        headers = ["Image", "Hash1", "Hash2", "Hash3", "Hash4", "Hash5"]
-        self.header_row = CustomRow(self.grid_frame, 0, headers)
-        self.row = 1  # Reset row counter after clearing rows
-        
-        with open(file_path, 'r') as file:
-            reader = csv.reader(file)
-            for row_data in reader:
-                self.add_row(row_data)
+        self.order = list(range(len(self.data)))
+        self.checked = set()
+        self.offset = 0
+        self.sort_column = None
+        self.sort_reverse = False
+        self.set_headers(headers)
+        self.refresh()
 class App:
     def __init__(self, root):
         self.table = CustomTable(root)
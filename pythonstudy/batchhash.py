@@ -0,0 +1,186 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+from hashengine import (ALGORITHMS, HASH_SIZE, _color_bits, bits_to_int, hash_file, hash_to_int,
+                        open_for_hashing, preprocess, thumbnail_sizes)
+from stats import NO_STATS
+
+
+def bits_to_ints(bits):
+    """Row-wise bits_to_int for an (N, ...) boolean array"""
+    bits = np.asarray(bits).reshape(len(bits), -1)
+    if bits.shape[1] == 64:
+        return np.packbits(bits, axis=1).view('>u8').ravel().tolist()
+    return [bits_to_int(row) for row in bits]
+
+
+def average_bits_batch(pixels):
+    """aHash bits of an (N, 8, 8) uint8 stack"""
+    return pixels > pixels.mean(axis=(1, 2), keepdims=True)
+
+
+def difference_bits_batch(pixels):
+    """dHash bits of an (N, 8, 9) uint8 stack"""
+    return pixels[:, :, 1:] > pixels[:, :, :-1]
+
+
+def perceptual_bits_batch(pixels):
+    """pHash bits of an (N, 32, 32) uint8 stack, with one batched DCT per axis"""
+    import scipy.fftpack
+    dct = scipy.fftpack.dct(scipy.fftpack.dct(pixels, axis=1), axis=2)
+    dctlowfreq = dct[:, :HASH_SIZE, :HASH_SIZE]
+    median = np.median(dctlowfreq.reshape(len(pixels), -1), axis=1)
+    return dctlowfreq > median[:, None, None]
+
+
+def wavelet_bits_batch(pixels):
+    """wHash bits of an (N, S, S) uint8 stack; all images must share the scale S"""
+    import pywt
+    ll_max_level = int(np.log2(pixels.shape[1]))
+    dwt_level = ll_max_level - int(np.log2(HASH_SIZE))
+    pixels = pixels / 255.
+    coeffs = list(pywt.wavedec2(pixels, 'haar', level=ll_max_level, axes=(1, 2)))
+    coeffs[0] *= 0
+    pixels = pywt.waverec2(coeffs, 'haar', axes=(1, 2))
+    dwt_low = pywt.wavedec2(pixels, 'haar', level=dwt_level, axes=(1, 2))[0]
+    median = np.median(dwt_low.reshape(len(pixels), -1), axis=1)
+    return dwt_low > median[:, None, None]
+
+
+BATCH_KERNELS = {
+    'Average Hash': average_bits_batch,
+    'Perceptual Hash': perceptual_bits_batch,
+    'Difference Hash': difference_bits_batch,
+    'Wavelet Hash': wavelet_bits_batch,
+}
+
+
+def compute_hashes_batch(stages, algorithms, stats=NO_STATS):
+    """hashengine.compute_hashes for many preprocessed images at once.
+
+    stages are preprocess() results (None for images that failed). Thumbnails
+    of the same size are stacked into one (N, H, W) array per algorithm and
+    hashed in a single kernel call; the color hash is not batched and must
+    already be in stage['Color Hash']. Returns a list of value tuples or None.
+    """
+    algorithms = list(algorithms)
+    ok = [i for i, stage in enumerate(stages) if stage is not None]
+    columns = {}
+    for name in algorithms:
+        values = [None] * len(stages)
+        if name == 'Color Hash':
+            for i in ok:
+                values[i] = stages[i]['Color Hash']
+        else:
+            # wHash thumbnails depend on the image size, so group by thumbnail size
+            groups = {}
+            for i in ok:
+                size = thumbnail_sizes(stages[i]['size'], [name])[name]
+                groups.setdefault(size, []).append(i)
+            for size, rows in groups.items():
+                # One timing per kernel call, which covers the whole group
+                with stats.timer('batch.' + name):
+                    pixels = np.stack([stages[i]['thumbnails'][size] for i in rows])
+                    hashed = bits_to_ints(BATCH_KERNELS[name](pixels))
+                for i, value in zip(rows, hashed):
+                    values[i] = value
+        columns[name] = values
+    return [tuple(columns[name][i] for name in algorithms) if stages[i] is not None else None
+            for i in range(len(stages))]
+
+
+def prepare(file_path, algorithms, fast_decode=0, stats=NO_STATS):
+    """Decode one file into the thumbnails the batch kernels need, or None on error"""
+    stats.count('images')
+    try:
+        with stats.timer('open'):
+            img = open_for_hashing(file_path, fast_decode)
+        with img:
+            with stats.timer('decode'):
+                img.load()
+            with stats.timer('preprocess'):
+                stage = preprocess(img, algorithms)
+    except Exception as e:
+        stats.count('errors')
+        print(f"Error processing {file_path}: {e}")
+        return None
+    if 'Color Hash' in algorithms:
+        # The full-size planes are only needed for the color hash; drop them right away
+        with stats.timer('hash.Color Hash'):
+            stage['Color Hash'] = bits_to_int(_color_bits(stage.pop('intensity'), stage.pop('hsv')))
+    return stage
+
+
+def hash_chunk_batched(file_paths, algorithms, fast_decode=0, stats=NO_STATS):
+    """hashengine.hash_chunk with the hashes of the whole chunk computed in batch"""
+    stages = [prepare(file_path, algorithms, fast_decode, stats) for file_path in file_paths]
+    return list(zip(file_paths, compute_hashes_batch(stages, algorithms, stats)))
+
+
+# Modes the equivalence check generates; each takes a different conversion path to grayscale and HSV
+VERIFY_MODES = ('RGB', 'L', 'RGBA', 'P', 'LA')
+
+
+def _random_image(rng, mode, size):
+    # A gradient under noise, so the hashes have structure and few median ties
+    width, height = size
+    bands = {'RGB': 3, 'L': 1, 'RGBA': 4, 'P': 1, 'LA': 2}[mode]
+    y, x = np.mgrid[0:height, 0:width]
+    ramp = (x * rng.uniform(-2, 2) + y * rng.uniform(-2, 2))[..., None]
+    pixels = (ramp + rng.normal(128, 40, (height, width, bands))).clip(0, 255).astype(np.uint8)
+    if bands == 1:
+        pixels = pixels[..., 0]
+    img = Image.fromarray(pixels, mode)
+    if mode == 'P':
+        img.putpalette(rng.integers(0, 256, 768, dtype=np.uint8).tobytes())
+    return img
+
+
+def verify_against_imagehash(count=25, seed=0, folder=None):
+    """Check hash_file and hash_chunk_batched against imagehash itself on generated images.
+
+    count PNGs cycle through VERIFY_MODES at random sizes from 8 to 700
+    pixels a side. Every algorithm must give imagehash's value bit for bit;
+    run this after upgrading Pillow, NumPy, SciPy, PyWavelets or imagehash.
+    Returns [(file, algorithm, imagehash value, hash_file value, batched
+    value)] for every disagreement, so an empty list means all match.
+    """
+    import shutil
+    import tempfile
+    rng = np.random.default_rng(seed)
+    algorithms = list(ALGORITHMS)
+    temp_folder = tempfile.mkdtemp(prefix="hashverify-", dir=folder)
+    try:
+        file_paths = []
+        for i in range(count):
+            mode = VERIFY_MODES[i % len(VERIFY_MODES)]
+            size = tuple(rng.integers(8, 701, 2).tolist())
+            file_path = os.path.join(temp_folder, f"{i:03d}_{mode}_{size[0]}x{size[1]}.png")
+            _random_image(rng, mode, size).save(file_path)
+            file_paths.append(file_path)
+        batched = dict(hash_chunk_batched(file_paths, algorithms))
+        mismatches = []
+        for file_path in file_paths:
+            with Image.open(file_path) as img:
+                expected = [hash_to_int(ALGORITHMS[name](img)) for name in algorithms]
+            single = hash_file(file_path, algorithms)[1] or [None] * len(algorithms)
+            grouped = batched[file_path] or [None] * len(algorithms)
+            for name, want, got, got_batched in zip(algorithms, expected, single, grouped):
+                if got != want or got_batched != want:
+                    mismatches.append((os.path.basename(file_path), name, want, got, got_batched))
+        return mismatches
+    finally:
+        shutil.rmtree(temp_folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import sys
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 25
+    mismatches = verify_against_imagehash(count)
+    for file_name, name, want, got, got_batched in mismatches:
+        print(f"{file_name} {name}: imagehash {want:x}, hash_file {got if got is None else format(got, 'x')}, "
+              f"batched {got_batched if got_batched is None else format(got_batched, 'x')}")
+    print(f"{len(mismatches)} mismatches in {count} images")
+    sys.exit(1 if mismatches else 0)
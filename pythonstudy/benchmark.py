@@ -0,0 +1,242 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageEnhance, ImageFilter
+
+# Corpus layout: (width, height) cycles with the formats, so every format gets every size
+RESOLUTIONS = [(320, 240), (1024, 768), (2048, 1536)]
+FORMATS = [('JPEG', '.jpg'), ('PNG', '.png'), ('BMP', '.bmp'), ('TIFF', '.tif')]
+MANIFEST = 'manifest.json'
+
+# Higher is better for these metric suffixes; everything else (times, memory) is lower-is-better
+HIGHER_IS_BETTER = ('_per_s', '_recall')
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and its finished children, or None if unknown"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss + \
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return usage / (2**20 if sys.platform == 'darwin' else 2**10)
+
+
+def _synthetic_image(rng, size):
+    # Smooth gradients plus a few blocks: compressible like photos, distinct for every seed
+    width, height = size
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    channels = []
+    for _ in range(3):
+        fx, fy, phase = rng.uniform(0.5, 4, 2).tolist() + [rng.uniform(0, 6.3)]
+        channels.append(127 + 120 * np.sin(fx * x / width * 6.3 + fy * y / height * 6.3 + phase))
+    pixels = np.stack(channels, axis=-1)
+    for _ in range(6):
+        w, h = int(rng.integers(width // 10, width // 3)), int(rng.integers(height // 10, height // 3))
+        left, top = int(rng.integers(0, width - w)), int(rng.integers(0, height - h))
+        pixels[top:top + h, left:left + w] = rng.integers(0, 256, 3)
+    return Image.fromarray(pixels.clip(0, 255).astype(np.uint8))
+
+
+def _near_duplicate(rng, img):
+    # Typical edits that should keep perceptual hashes close: rescale, brightness, blur
+    width, height = img.size
+    scale = rng.uniform(0.5, 0.9)
+    img = img.resize((max(8, int(width * scale)), max(8, int(height * scale))), Image.LANCZOS)
+    img = ImageEnhance.Brightness(img).enhance(rng.uniform(0.9, 1.1))
+    return img.filter(ImageFilter.GaussianBlur(rng.uniform(0, 1)))
+
+
+def make_corpus(folder, count=200, seed=0, duplicate_fraction=0.25):
+    """Write a deterministic corpus of count images, a share of them planted near-duplicates.
+
+    Returns the manifest: file list and the (original, copy) pairs. An existing
+    corpus with the same parameters is reused.
+    """
+    params = {'count': count, 'seed': seed, 'duplicate_fraction': duplicate_fraction}
+    manifest_path = os.path.join(folder, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest['params'] == params and all(os.path.exists(p) for p in manifest['files']):
+            return manifest
+
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    originals = count - int(count * duplicate_fraction)
+    files, pairs, images = [], [], []
+    for i in range(count):
+        image_format, extension = FORMATS[i % len(FORMATS)]
+        if i < originals:
+            img = _synthetic_image(rng, RESOLUTIONS[i % len(RESOLUTIONS)])
+            images.append(img)
+        else:
+            source = int(rng.integers(0, originals))
+            img = _near_duplicate(rng, images[source])
+            pairs.append((source, i))
+        path = os.path.join(folder, f"img_{i:05d}{extension}")
+        img.save(path, image_format, **({'quality': 85} if image_format == 'JPEG' else {}))
+        files.append(path)
+    manifest = {'params': params, 'files': files, 'pairs': pairs}
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _percentiles(prefix, samples):
+    samples = np.array(samples) * 1000
+    return {f"{prefix}_p50_ms": float(np.percentile(samples, 50)),
+            f"{prefix}_p90_ms": float(np.percentile(samples, 90)),
+            f"{prefix}_p99_ms": float(np.percentile(samples, 99))}
+
+
+def bench_hashing(files, workers_list, backends, batched=False):
+    from hashengine import ALGORITHMS, hash_files
+    results = {}
+    # Each algorithm alone, single worker, to see its own cost
+    for name in ALGORITHMS:
+        _, seconds = _timed(lambda: list(hash_files(files, [name], 'thread', 1)))
+        results[f"hash_{name.split()[0].lower()}_images_per_s"] = len(files) / seconds
+    # All algorithms together on every backend and worker count
+    for backend in backends:
+        for workers in workers_list:
+            _, seconds = _timed(lambda: list(hash_files(files, list(ALGORITHMS), backend, workers,
+                                                        batched=batched)))
+            results[f"hash_all_{backend}_{workers}w_images_per_s"] = len(files) / seconds
+    return results
+
+
+def duplicate_recall(files, pairs, max_distance=10):
+    """Share of planted near-duplicate pairs whose pHash is within max_distance"""
+    from hashengine import hash_files
+    values = dict(hash_files(files, ['Perceptual Hash'], 'thread'))
+    found = sum(bin(values[files[a]][0] ^ values[files[b]][0]).count('1') <= max_distance
+                for a, b in pairs if values[files[a]] and values[files[b]])
+    return {'phash_duplicate_recall': found / max(1, len(pairs))}
+
+
+def _synthetic_hash_csv(path, rows, seed):
+    from hashengine import ALGORITHMS, HEX_WIDTH
+    rng = np.random.default_rng(seed)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Image'] + list(ALGORITHMS))
+        columns = [[format(v, f'0{HEX_WIDTH[name]}x') for v in
+                    (rng.integers(0, 2**63, rows, dtype=np.uint64) >> np.uint64(64 - 4 * HEX_WIDTH[name])).tolist()]
+                   for name in ALGORITHMS]
+        paths = [f"/photos/folder{i % 500}/image_{i:08d}.jpg" for i in range(rows)]
+        writer.writerows(zip(paths, *columns))
+
+
+def bench_loading_and_queries(folder, rows, queries, seed):
+    import pandas as pd
+    from hashindex import HashIndex
+    from hashstore import HashStore, import_csv
+    from searchindex import SearchIndex
+
+    csv_path = os.path.join(folder, f"hashes_{rows}.csv")
+    if not os.path.exists(csv_path):
+        _synthetic_hash_csv(csv_path, rows, seed)
+    for stale in (csv_path + '.index.npz',):
+        if os.path.exists(stale):
+            os.remove(stale)
+    results = {}
+    data, results['csv_load_s'] = _timed(pd.read_csv, csv_path, dtype=str, keep_default_na=False)
+    index, results['hash_index_build_s'] = _timed(lambda: HashIndex.from_frame(data).build_mih())
+    store_path, results['store_import_s'] = _timed(import_csv, csv_path)
+    store, results['store_open_s'] = _timed(HashStore, store_path)
+    searcher, results['search_index_build_s'] = _timed(
+        SearchIndex, data.iloc[:, 0].tolist(), [data.iloc[:, c].tolist() for c in range(1, data.shape[1])])
+
+    rng = np.random.default_rng(seed)
+    query_rows = rng.integers(0, rows, queries).tolist()
+    results.update(_percentiles('query_nearest', [_timed(index.nearest, 1, r, 20)[1] for r in query_rows]))
+    results.update(_percentiles('query_combined', [_timed(index.combined_nearest, r, 20)[1] for r in query_rows]))
+    terms = [data.iloc[r, 0][-12:-4] for r in query_rows]
+    results.update(_percentiles('query_search', [_timed(searcher.search, t)[1] for t in terms]))
+    return results
+
+
+def compare(results, baseline, tolerance=0.1):
+    """[(metric, baseline, current, change)] for metrics more than tolerance worse than baseline"""
+    regressions = []
+    for name, old in baseline.get('results', {}).items():
+        new = results['results'].get(name)
+        if new is None or old is None or old == 0:
+            continue
+        change = (new - old) / abs(old)
+        worse = change < -tolerance if name.endswith(HIGHER_IS_BETTER) else change > tolerance
+        if worse:
+            regressions.append((name, old, new, change))
+    return regressions
+
+
+def run(args):
+    manifest = make_corpus(args.corpus, args.images, args.seed)
+    files = manifest['files']
+    results = {}
+    results.update(bench_hashing(files, args.workers, args.backends, args.batched))
+    results.update(duplicate_recall(files, manifest['pairs']))
+    results.update(bench_loading_and_queries(args.corpus, args.rows, args.queries, args.seed))
+    results['peak_rss_mb'] = peak_rss_mb()
+    return {
+        'meta': {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'params': {'images': args.images, 'seed': args.seed, 'rows': args.rows, 'queries': args.queries,
+                       'workers': args.workers, 'backends': args.backends, 'batched': args.batched},
+        },
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark hashing, loading and queries on a synthetic corpus")
+    parser.add_argument('--corpus', default='bench_corpus', help="folder for the generated images (reused)")
+    parser.add_argument('--images', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=lambda s: [int(v) for v in s.split(',')], default=[1, 2, 4])
+    parser.add_argument('--backends', type=lambda s: s.split(','), default=['thread', 'process'])
+    parser.add_argument('--batched', action='store_true', help="use the NumPy batch kernels")
+    parser.add_argument('--rows', type=int, default=200000, help="rows in the synthetic hash CSV")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--baseline', help="earlier results JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="allowed relative slowdown")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    for name, value in results['results'].items():
+        print(f"{name:45s} {value if value is None else round(value, 4)}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, old, new, change in regressions:
+            print(f"REGRESSION {name}: {old:.4g} -> {new:.4g} ({change:+.0%})")
+        return 1 if regressions else 0
+    return 0
+
+
+# Process-pool workers import this module, so only run from the command line
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+import csv
+import io
+import os
+from itertools import islice
+
+# Rows parsed per batch; progress is reported once per batch, not per row
+BATCH_ROWS = 50000
+
+
+def read_batches(path, batch_rows=BATCH_ROWS, encoding='utf-8'):
+    """Yield (rows, bytes_done, bytes_total) for a CSV, batch_rows parsed rows at a time.
+
+    Progress is the byte offset reached in the file, so there is no pre-pass
+    to count lines. The header line is returned as part of the first batch.
+    """
+    total = os.path.getsize(path)
+    with open(path, 'rb') as raw:
+        reader = csv.reader(io.TextIOWrapper(raw, encoding=encoding, newline=''))
+        while True:
+            rows = list(islice(reader, batch_rows))
+            if not rows:
+                return
+            yield rows, raw.tell(), total
+
+
+def iter_rows(path, batch_rows=BATCH_ROWS, encoding='utf-8'):
+    """Every parsed row of a CSV, read in large batches"""
+    for rows, _, _ in read_batches(path, batch_rows, encoding):
+        yield from rows
+
+
+def read_frames(path, chunk_rows=BATCH_ROWS, **read_csv_options):
+    """Yield (DataFrame, bytes_done, bytes_total) chunks from pandas.read_csv"""
+    import pandas as pd
+    total = os.path.getsize(path)
+    with open(path, 'rb') as raw:
+        for frame in pd.read_csv(raw, chunksize=chunk_rows, **read_csv_options):
+            # pandas reads ahead in blocks, so the offset can run slightly ahead of the rows
+            yield frame, min(raw.tell(), total), total
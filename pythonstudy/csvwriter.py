@@ -0,0 +1,93 @@
+import csv
+import os
+import queue
+import threading
+import time
+from stats import NO_STATS
+
+_CLOSE = object()
+
+
+class CSVWriterThread:
+    """One thread owns the output CSV; workers hand it rows through a bounded queue.
+
+    Rows are written in batches and flushed once batch_size rows are
+    buffered or flush_interval seconds have passed. The header is written
+    exactly once, by the writer thread, and only when the file is empty.
+    Rows may be dicts (when fieldnames is given) or plain lists.
+    Each batch write is timed as 'csv.write' in stats.
+    """
+
+    def __init__(self, path, fieldnames=None, append=False, header=True,
+                 batch_size=500, flush_interval=1.0, max_queue=10000, stats=NO_STATS):
+        self.path = path
+        self.fieldnames = fieldnames
+        self.append = append
+        self.header = header and fieldnames is not None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.stats = stats
+        self.rows_written = 0
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write(self, row):
+        # Blocks when the queue is full, so fast producers wait for the disk
+        self.queue.put(row)
+
+    def close(self):
+        """Write everything still queued and wait for the writer thread"""
+        self.queue.put(_CLOSE)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        try:
+            with open(self.path, 'a' if self.append else 'w', newline='', encoding='utf-8') as file:
+                if self.fieldnames is not None:
+                    writer = csv.DictWriter(file, fieldnames=self.fieldnames)
+                else:
+                    writer = csv.writer(file)
+                if self.header and os.fstat(file.fileno()).st_size == 0:
+                    writer.writeheader()
+                self._drain(file, writer)
+        except Exception as e:
+            self.error = e
+            # Keep consuming so producers never block on a dead writer
+            while self.queue.get() is not _CLOSE:
+                pass
+
+    def _drain(self, file, writer):
+        buffer = []
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                row = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                row = None
+            if row is _CLOSE:
+                break
+            if row is not None:
+                buffer.append(row)
+            if len(buffer) >= self.batch_size or time.monotonic() - last_flush >= self.flush_interval:
+                self._flush(file, writer, buffer)
+                buffer = []
+                last_flush = time.monotonic()
+        self._flush(file, writer, buffer)
+
+    def _flush(self, file, writer, buffer):
+        with self.stats.timer('csv.write'):
+            if buffer:
+                writer.writerows(buffer)
+                self.rows_written += len(buffer)
+            file.flush()
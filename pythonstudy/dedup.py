@@ -0,0 +1,98 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# Bytes read from each end of a file for the cheap partial hash
+EDGE_BLOCK = 64 * 1024
+# Read size for full-file hashing; memory per file stays at this size
+CHUNK_SIZE = 1024 * 1024
+
+
+def _new_digest():
+    # xxhash when installed, otherwise blake2b, which is faster than md5 on 64-bit machines
+    if xxhash is not None:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+
+def list_files(directory, recursive=False):
+    """All regular files in directory (and its subfolders when recursive), sorted by path"""
+    if not recursive:
+        return sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                      if os.path.isfile(os.path.join(directory, f)))
+    from scanner import DirectoryScanner
+    return sorted(DirectoryScanner(directory, extensions=None))
+
+
+def partial_hash(path, size):
+    """Digest of the first and last EDGE_BLOCK bytes, which is the whole file for small files"""
+    digest = _new_digest()
+    with open(path, 'rb') as f:
+        digest.update(f.read(EDGE_BLOCK))
+        if size > 2 * EDGE_BLOCK:
+            f.seek(-EDGE_BLOCK, os.SEEK_END)
+        digest.update(f.read(EDGE_BLOCK))
+    return digest.digest()
+
+
+def full_hash(path):
+    """Digest of the whole file, read in fixed-size chunks"""
+    digest = _new_digest()
+    buffer = bytearray(CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.digest()
+
+
+def _refine(groups, key_func, executor, progress, done, total):
+    """Split each group by key_func(path, size), keeping only keys shared by two or more files"""
+    futures = {executor.submit(key_func, path, size): (size, path) for size, paths in groups for path in paths}
+    buckets = {}
+    for future in as_completed(futures):
+        size, path = futures[future]
+        try:
+            buckets.setdefault((size, future.result()), []).append(path)
+        except OSError as e:
+            print(f"Error reading {path}: {e}")
+        done[0] += 1
+        if progress:
+            progress(done[0], total)
+    return [(size, sorted(paths)) for (size, _), paths in buckets.items() if len(paths) > 1]
+
+
+def find_duplicates(paths, workers=None, progress=None):
+    """Groups of files with identical content; within each group the first path is the one to keep.
+
+    Stage 1 groups by size, so files with a unique size are never read.
+    Stage 2 hashes only the first and last block of each remaining file.
+    Stage 3 hashes whole files, and only those still colliding after stage 2.
+    progress(done, total) is called from the calling thread.
+    """
+    by_size = {}
+    for path in paths:
+        try:
+            by_size.setdefault(os.path.getsize(path), []).append(path)
+        except OSError as e:
+            print(f"Error reading {path}: {e}")
+    groups = [(size, sorted(group)) for size, group in by_size.items() if len(group) > 1]
+
+    done = [0]
+    total = sum(len(group) for _, group in groups)
+    with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) * 4)) as executor:
+        groups = _refine(groups, partial_hash, executor, progress, done, total)
+        # Files no larger than two edge blocks were hashed completely in stage 2
+        small = [group for group in groups if group[0] <= 2 * EDGE_BLOCK]
+        large = [group for group in groups if group[0] > 2 * EDGE_BLOCK]
+        total += sum(len(group) for _, group in large)
+        large = _refine(large, lambda path, size: full_hash(path), executor, progress, done, total)
+    return sorted(group for _, group in small + large)
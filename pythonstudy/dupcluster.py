@@ -0,0 +1,157 @@
+import csv
+import math
+import numpy as np
+from hashindex import popcount
+
+# Rows in one band bucket beyond this are verified block-wise instead of pair by pair
+SMALL_BUCKET = 64
+
+
+class UnionFind:
+    """Union-find over row numbers, merging whole arrays of pairs per round"""
+
+    def __init__(self, size):
+        self.parent = np.arange(size, dtype=np.int64)
+
+    def _compress(self):
+        while True:
+            grand = self.parent[self.parent]
+            if np.array_equal(grand, self.parent):
+                return
+            self.parent = grand
+
+    def union_pairs(self, a, b):
+        a = np.asarray(a, dtype=np.int64)
+        b = np.asarray(b, dtype=np.int64)
+        while a.size:
+            self._compress()
+            ra, rb = self.parent[a], self.parent[b]
+            differ = ra != rb
+            if not differ.any():
+                return
+            ra, rb = ra[differ], rb[differ]
+            a, b = a[differ], b[differ]
+            # Hook the larger root under the smaller one; conflicts resolve to the minimum
+            np.minimum.at(self.parent, np.maximum(ra, rb), np.minimum(ra, rb))
+
+    def labels(self):
+        self._compress()
+        return self.parent
+
+
+def combine_columns(index, columns):
+    """Concatenate the packed words of several hash columns, valid only where all are"""
+    packed = np.hstack([index.packed[c] for c in columns])
+    valid = np.logical_and.reduce([index.valid[c] for c in columns])
+    return packed, valid
+
+
+def lsh_parameters(n_rows, n_bits, threshold, recall=0.999):
+    """Bits per band and band count so a pair at the threshold is found with the given recall"""
+    band_bits = int(min(n_bits, max(8, math.ceil(math.log2(max(n_rows, 2))))))
+    p = (1 - threshold / n_bits) ** band_bits
+    if p <= 0 or p >= 1:
+        return band_bits, 1
+    bands = math.ceil(math.log(1 - recall) / math.log(1 - p))
+    return band_bits, max(1, bands)
+
+
+def _band_keys(packed, positions):
+    """Key made of the sampled bit positions (bit 0 = most significant bit of word 0)"""
+    keys = np.zeros(packed.shape[0], dtype=np.uint64)
+    for pos in positions:
+        word, bit = divmod(int(pos), 64)
+        keys = (keys << np.uint64(1)) | ((packed[:, word] >> np.uint64(63 - bit)) & np.uint64(1))
+    return keys
+
+
+def _bucket_pairs(keys):
+    """All row pairs (i, j), i < j in sorted position, that share a band key"""
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    n = order.size
+    if n < 2:
+        return [], []
+    boundary = np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1
+    starts = np.concatenate([[0], boundary])
+    sizes = np.diff(np.concatenate([starts, [n]]))
+    run_id = np.repeat(np.arange(starts.size), sizes)
+    small = np.repeat(sizes <= SMALL_BUCKET, sizes)
+
+    first, second = [], []
+    for d in range(1, int(min(sizes.max(), SMALL_BUCKET + 1))):
+        same = (run_id[d:] == run_id[:-d]) & small[d:]
+        i = np.flatnonzero(same)
+        first.append(order[i])
+        second.append(order[i + d])
+    for start, size in zip(starts[sizes > SMALL_BUCKET], sizes[sizes > SMALL_BUCKET]):
+        rows = order[start:start + size]
+        i, j = np.triu_indices(size, 1)
+        first.append(rows[i])
+        second.append(rows[j])
+    return first, second
+
+
+def find_clusters(packed, valid, threshold, band_bits=None, bands=None, recall=0.999, seed=0, progress=None):
+    """Group rows whose Hamming distance is at most threshold.
+
+    Candidate pairs come from bit-sampling LSH bands; each candidate is
+    verified with the exact distance before it joins a cluster. Returns
+    an array of cluster labels (the smallest row number in each cluster).
+    """
+    n_bits = packed.shape[1] * 64
+    rows = np.flatnonzero(valid)
+    uf = UnionFind(packed.shape[0])
+
+    # Exact duplicates collapse into one representative before banding
+    unique, first_row, inverse = np.unique(packed[rows], axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    uf.union_pairs(rows, rows[first_row][inverse])
+    reps = rows[first_row]
+
+    default_bits, default_bands = lsh_parameters(reps.size, n_bits, threshold, recall)
+    band_bits = band_bits or default_bits
+    bands = bands or default_bands
+    rng = np.random.default_rng(seed)
+    close_a, close_b = [], []
+    for band in range(bands):
+        positions = rng.choice(n_bits, size=min(band_bits, n_bits, 64), replace=False)
+        first, second = _bucket_pairs(_band_keys(unique, positions))
+        for a, b in zip(first, second):
+            if not a.size:
+                continue
+            dist = popcount(np.bitwise_xor(unique[a], unique[b]))
+            close = dist <= threshold
+            close_a.append(reps[a[close]])
+            close_b.append(reps[b[close]])
+        if progress:
+            progress(band + 1, bands)
+    if close_a:
+        uf.union_pairs(np.concatenate(close_a), np.concatenate(close_b))
+
+    labels = uf.labels().copy()
+    labels[~valid] = -1
+    return labels
+
+
+def cluster_groups(labels, min_size=2):
+    """[[row, ...], ...] for every cluster with at least min_size rows, largest first"""
+    rows = np.flatnonzero(labels >= 0)
+    order = rows[np.argsort(labels[rows], kind="stable")]
+    if order.size == 0:
+        return []
+    split = np.flatnonzero(labels[order][1:] != labels[order][:-1]) + 1
+    groups = [g.tolist() for g in np.split(order, split) if g.size >= min_size]
+    groups.sort(key=lambda g: (-len(g), g[0]))
+    return groups
+
+
+def save_clusters_csv(path, groups, data, packed):
+    """Write one line per clustered image: cluster number, distance to the first member, then the CSV row"""
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Cluster', 'Distance'] + list(data.columns))
+        for cluster, group in enumerate(groups, 1):
+            dist = popcount(np.bitwise_xor(packed[group], packed[group[0]]))
+            for row, d in zip(group, dist):
+                writer.writerow([cluster, int(d)] + list(data.iloc[row]))
@@ -0,0 +1,48 @@
+from PIL import Image
+
+# Modes Image.reduce can work on; anything else is decoded at full size
+REDUCE_MODES = ('L', 'LA', 'RGB', 'RGBA', 'RGBa', 'La', 'CMYK', 'I', 'F')
+
+
+def decode_reduced(img, size):
+    """Load img at the smallest scale that is still at least size = (width, height).
+
+    JPEGs are scaled by the decoder itself (DCT draft mode, 1/2 to 1/8), so
+    the full-resolution image is never built. Other formats are decoded
+    fully and then shrunk by an integer box reduce before any resize.
+    Returns the loaded image, which may be a new object.
+    """
+    width, height = max(1, int(size[0])), max(1, int(size[1]))
+    if img.format == 'JPEG':
+        img.draft(None, (width, height))
+        img.load()
+        return img
+    img.load()
+    factor = min(img.width // width, img.height // height)
+    if factor >= 2 and img.mode in REDUCE_MODES:
+        return img.reduce(factor)
+    return img
+
+
+def min_side_size(image_size, min_side):
+    """Smallest (width, height) with the same aspect ratio whose shorter side is min_side"""
+    width, height = image_size
+    scale = min_side / max(1, min(width, height))
+    if scale >= 1:
+        return width, height
+    return -(-width * min_side // min(width, height)), -(-height * min_side // min(width, height))
+
+
+def fit_size(image_size, box):
+    """Size of image_size scaled to fit inside box = (width, height)"""
+    width, height = image_size
+    scale = min(box[0] / width, box[1] / height)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def open_preview(file_path, box):
+    """Open file_path decoded only as large as needed, resized to fit box"""
+    img = Image.open(file_path)
+    target = fit_size(img.size, box)
+    img = decode_reduced(img, target)
+    return img.resize(target, Image.LANCZOS)
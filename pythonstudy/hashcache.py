@@ -0,0 +1,155 @@
+import os
+import sqlite3
+import threading
+
+# Shared by all the hashing tools and the similarity viewer
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.imagehash_cache.sqlite')
+
+# Commit after this many writes so a crash loses little work
+COMMIT_EVERY = 500
+
+
+def _cache_key(algorithm, fast_decode):
+    # Fast-decode hashes may differ from full-decode ones, so they are cached separately
+    return f"{algorithm}@{fast_decode}" if fast_decode else algorithm
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class HashCache:
+    """On-disk hash cache keyed by absolute path, file size, mtime and algorithm"""
+
+    def __init__(self, db_path=DEFAULT_CACHE_PATH):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS hashes (
+                                 path TEXT NOT NULL, algorithm TEXT NOT NULL,
+                                 size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, value TEXT NOT NULL,
+                                 PRIMARY KEY (path, algorithm))""")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS image_info (
+                                 path TEXT PRIMARY KEY,
+                                 size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,
+                                 format TEXT, width INTEGER, height INTEGER, mode TEXT)""")
+        self.conn.commit()
+
+    def _written(self, count=1):
+        self.pending += count
+        if self.pending >= COMMIT_EVERY:
+            self.conn.commit()
+            self.pending = 0
+
+    def get(self, path, algorithms, fast_decode=0, stat=None):
+        """Cached (int, ...) for every algorithm, or None if any is missing or the file changed"""
+        path = os.path.abspath(path)
+        stat = stat or _stat(path)
+        if stat is None:
+            return None
+        keys = [_cache_key(name, fast_decode) for name in algorithms]
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT algorithm, value FROM hashes WHERE path = ? AND size = ? AND mtime_ns = ? "
+                f"AND algorithm IN ({','.join('?' * len(keys))})", [path, stat[0], stat[1]] + keys).fetchall()
+        found = dict(rows)
+        if len(found) != len(keys):
+            return None
+        return tuple(int(found[key], 16) for key in keys)
+
+    def put(self, path, algorithms, values, fast_decode=0, stat=None):
+        path = os.path.abspath(path)
+        stat = stat or _stat(path)
+        if stat is None:
+            return
+        rows = [(path, _cache_key(name, fast_decode), stat[0], stat[1], format(value, 'x'))
+                for name, value in zip(algorithms, values)]
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?)", rows)
+            self._written(len(rows))
+
+    def get_info(self, path, stat=None):
+        """Cached (format, width, height, mode) of an image, or None if missing or stale"""
+        path = os.path.abspath(path)
+        stat = stat or _stat(path)
+        if stat is None:
+            return None
+        with self.lock:
+            row = self.conn.execute("SELECT format, width, height, mode FROM image_info "
+                                    "WHERE path = ? AND size = ? AND mtime_ns = ?", (path, stat[0], stat[1])).fetchone()
+        return row
+
+    def put_info(self, path, info, stat=None):
+        path = os.path.abspath(path)
+        stat = stat or _stat(path)
+        if stat is None:
+            return
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO image_info VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              (path, stat[0], stat[1]) + tuple(info))
+            self._written()
+
+    def evict_missing(self, folder=None):
+        """Drop entries for files that no longer exist, optionally only under folder"""
+        query = "SELECT DISTINCT path FROM {}"
+        args = ()
+        if folder:
+            prefix = os.path.join(os.path.abspath(folder), '')
+            query += " WHERE substr(path, 1, ?) = ?"
+            args = (len(prefix), prefix)
+        removed = 0
+        for table in ('hashes', 'image_info'):
+            with self.lock:
+                paths = [row[0] for row in self.conn.execute(query.format(table), args)]
+            missing = [(path,) for path in paths if not os.path.exists(path)]
+            if missing:
+                with self.lock:
+                    self.conn.executemany(f"DELETE FROM {table} WHERE path = ?", missing)
+                    self.conn.commit()
+                removed += len(missing)
+        return removed
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+            self.pending = 0
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+
+def hash_files_cached(file_paths, algorithms, cache, fast_decode=0, stats=None, **options):
+    """hashengine.hash_files that serves unchanged files from the cache and stores new results.
+
+    Hits are yielded as soon as they are looked up, so a rerun where nothing
+    changed streams at lookup speed with nothing buffered.
+    """
+    from hashengine import hash_files
+    algorithms = list(algorithms)
+    hit_paths = set()
+
+    def lookup(file_path):
+        values = cache.get(file_path, algorithms, fast_decode)
+        if values is not None:
+            if stats is not None:
+                stats.count('cache.hits')
+            hit_paths.add(file_path)
+        return values
+
+    for file_path, values in hash_files(file_paths, algorithms, fast_decode=fast_decode, stats=stats, lookup=lookup,
+                                        **options):
+        if file_path in hit_paths:
+            hit_paths.discard(file_path)
+        elif values is not None:
+            cache.put(file_path, algorithms, values, fast_decode)
+        yield file_path, values
+    cache.commit()
@@ -0,0 +1,290 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+# Command-line front end for hashjobs: hash, query, cluster and dedup without Tk.
+# Only argparse and the standard library load at startup; each command imports
+# what it needs, so `--help` and a query on a cached index stay quick.
+
+# Short names accepted by --algorithms, in the column order the hashing tools write
+ALGORITHM_NAMES = {
+    'ahash': 'Average Hash',
+    'phash': 'Perceptual Hash',
+    'dhash': 'Difference Hash',
+    'whash': 'Wavelet Hash',
+    'color': 'Color Hash',
+}
+
+
+def parse_algorithms(text):
+    names = [name.strip().lower() for name in text.split(',') if name.strip()]
+    unknown = [name for name in names if name not in ALGORITHM_NAMES]
+    if unknown or not names:
+        raise argparse.ArgumentTypeError(f"unknown algorithm(s) {', '.join(unknown) or text!r}; "
+                                         f"choose from {', '.join(ALGORITHM_NAMES)}")
+    return [full for short, full in ALGORITHM_NAMES.items() if short in names]
+
+
+def column_number(names, text):
+    """Position of a hash column given as its CSV name or short name"""
+    name = ALGORITHM_NAMES.get(text.lower(), text)
+    if name not in names:
+        raise SystemExit(f"No hash column {text!r}; the file has {', '.join(names)}")
+    return names.index(name)
+
+
+def print_progress(label):
+    def report(done, total=None):
+        text = f"{label}: {done}" if total is None else f"{label}: {done}/{total}"
+        print(f"\r{text}", end="", file=sys.stderr, flush=True)
+    return report
+
+
+def write_rows(rows, fieldnames, output, output_format):
+    """rows (dicts) as csv, json or aligned text, to a file or stdout when output is '-'"""
+    file = sys.stdout if output == '-' else open(output, 'w', newline='', encoding='utf-8')
+    try:
+        if output_format == 'json':
+            json.dump(rows, file, indent=2, ensure_ascii=False)
+            file.write("\n")
+        elif output_format == 'csv':
+            import csv
+            writer = csv.DictWriter(file, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                file.write("  ".join(str(row[name]) for name in fieldnames) + "\n")
+    finally:
+        if file is not sys.stdout:
+            file.close()
+
+
+def cmd_hash(args):
+    from hashjobs import find_images, hash_images
+    from stats import Stats
+    # Fail before hashing anything rather than when the first row is written
+    folder = os.path.dirname(os.path.abspath(args.output))
+    if not os.path.isdir(folder):
+        raise SystemExit(f"Output folder {folder} does not exist")
+    stats = Stats()
+    csv_path = args.output if args.format in ('csv', 'both') else None
+    store_path = None
+    if args.format in ('hashstore', 'both'):
+        from hashstore import store_path_for
+        store_path = store_path_for(args.output)
+    cache = None
+    if not args.no_cache:
+        from hashcache import HashCache
+        cache = HashCache()
+    file_paths = find_images(args.sources, recursive=not args.no_recursive, stats=stats)
+    fast_decode = 0
+    if args.fast_decode:
+        from hashengine import FAST_DECODE_MIN_SIDE
+        fast_decode = FAST_DECODE_MIN_SIDE
+    try:
+        processed = hash_images(file_paths, args.algorithms, csv_path, store_path, append=not args.overwrite,
+                                full_path=args.full_path, cache=cache, stats=stats,
+                                progress=None if args.quiet else print_progress("Hashed"),
+                                backend=args.backend, workers=args.workers, chunk_size=args.chunk_size,
+                                fast_decode=fast_decode, batched=args.batched)
+    finally:
+        if cache is not None:
+            cache.close()
+    if not args.quiet:
+        print(file=sys.stderr)
+        print(stats.summary('done', processed), file=sys.stderr)
+    if args.profile:
+        stats.dump(args.profile, command='hash', algorithms=args.algorithms, backend=args.backend,
+                   workers=args.workers, chunk_size=args.chunk_size, batched=args.batched)
+    return 0
+
+
+def cmd_query(args):
+    from hashjobs import find_row, open_hashes, similar_images
+    frame, index = open_hashes(args.hashes)
+    column = None if args.column == 'combined' else column_number(index.names, args.column)
+    try:
+        row = find_row(frame, args.image)
+    except KeyError:
+        raise SystemExit(f"{args.image} is not in {args.hashes}")
+    results = similar_images(index, row, column, k=args.k)
+    score = 'Score' if column is None else 'Distance'
+    rows = [{score: round(float(value), 4) if column is None else int(value), **frame.iloc[r].to_dict()}
+            for value, r in results]
+    write_rows(rows, [score] + list(frame.columns), args.output, args.format)
+    return 0
+
+
+def cmd_cluster(args):
+    from hashjobs import duplicate_groups, open_hashes
+    frame, index = open_hashes(args.hashes)
+    columns = None if args.columns is None else [column_number(index.names, c) for c in args.columns.split(',')]
+    groups, packed = duplicate_groups(index, columns, args.threshold,
+                                      progress=None if args.quiet else print_progress("Bands"))
+    if not args.quiet:
+        print(f"\n{len(groups)} groups, {sum(len(g) for g in groups)} images", file=sys.stderr)
+    if args.format == 'csv' and args.output != '-':
+        from dupcluster import save_clusters_csv
+        save_clusters_csv(args.output, groups, frame, packed)
+    else:
+        paths = frame.iloc[:, 0]
+        rows = [{'Cluster': cluster, 'Image': paths.iloc[row]} for cluster, group in enumerate(groups, 1)
+                for row in group]
+        write_rows(rows, ['Cluster', 'Image'], args.output, args.format)
+    return 0
+
+
+def cmd_dedup(args):
+    from dedup import find_duplicates, list_files
+    paths = [path for folder in args.folders for path in list_files(folder, args.recursive)]
+    groups = find_duplicates(paths, workers=args.workers,
+                             progress=None if args.quiet else print_progress("Compared"))
+    if not args.quiet:
+        print(file=sys.stderr)
+    # Reports only; the first path of each group is the one renamechkrp would keep
+    rows = [{'Group': number, 'Keep': i == 0, 'Path': path}
+            for number, group in enumerate(groups, 1) for i, path in enumerate(group)]
+    write_rows(rows, ['Group', 'Keep', 'Path'], args.output, args.format)
+    return 0
+
+
+def cmd_split(args):
+    from shards import split_file_list
+    fast_decode = 0
+    if args.fast_decode:
+        from hashengine import FAST_DECODE_MIN_SIDE
+        fast_decode = FAST_DECODE_MIN_SIDE
+    manifest_path = split_file_list(args.list, args.shards, args.algorithms, fast_decode, args.manifest)
+    print(manifest_path)
+    return 0
+
+
+def cmd_hash_shard(args):
+    from shards import hash_shard
+    from stats import Stats
+    stats = Stats()
+    cache = None
+    if not args.no_cache:
+        from hashcache import HashCache
+        cache = HashCache()
+    try:
+        done = hash_shard(args.manifest, args.index, args.decode_threads, args.hash_threads, cache=cache, stats=stats,
+                          progress=None if args.quiet else print_progress(f"Shard {args.index}"))
+    finally:
+        if cache is not None:
+            cache.close()
+    if not args.quiet:
+        print(file=sys.stderr)
+        print(stats.summary('done', done), file=sys.stderr)
+    if args.profile:
+        stats.dump(args.profile, command='hash-shard', shard=args.index)
+    return 0
+
+
+def cmd_merge(args):
+    from shards import merge_hash_files, merge_shards
+    options = dict(run_rows=args.run_rows, temp_dir=args.temp_dir, store_path=None if args.store else False)
+    if args.inputs[0].endswith('.json'):
+        written, missing = merge_shards(args.inputs[0], args.output, **options)
+        if not args.quiet:
+            print(f"{written} rows merged, {missing} list entries without hashes", file=sys.stderr)
+    else:
+        written = merge_hash_files(args.inputs, args.output, parse_algorithms(args.algorithms), **options)
+        if not args.quiet:
+            print(f"{written} rows merged", file=sys.stderr)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Image hashing, similarity queries and duplicate search")
+    parser.add_argument('-q', '--quiet', action='store_true', help="no progress or summary on stderr")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('hash', help="hash image files and folders")
+    p.add_argument('sources', nargs='+', help="image files or folders")
+    p.add_argument('-a', '--algorithms', type=parse_algorithms, default=list(ALGORITHM_NAMES.values()),
+                   help=f"comma-separated subset of {','.join(ALGORITHM_NAMES)} (default: all)")
+    p.add_argument('-o', '--output', default='hashes.csv', help="CSV path; the store goes beside it as .hashstore")
+    p.add_argument('-f', '--format', choices=('csv', 'hashstore', 'both'), default='both')
+    p.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 4)
+    p.add_argument('--backend', choices=('process', 'thread'), default='process')
+    p.add_argument('--chunk-size', type=int, default=32)
+    p.add_argument('--batched', action='store_true', help="NumPy batch kernels")
+    p.add_argument('--fast-decode', action='store_true', help="decode at reduced size (hashes may drift)")
+    p.add_argument('--no-cache', action='store_true', help="hash every file even if unchanged")
+    p.add_argument('--no-recursive', action='store_true', help="only the top level of each folder")
+    p.add_argument('--full-path', action='store_true', help="write absolute paths instead of file names")
+    p.add_argument('--overwrite', action='store_true', help="replace the outputs instead of appending")
+    p.add_argument('--profile', help="write per-stage timings to this JSON file")
+    p.set_defaults(func=cmd_hash)
+
+    p = commands.add_parser('query', help="images most similar to one already hashed")
+    p.add_argument('hashes', help="hashes CSV or .hashstore")
+    p.add_argument('image', help="path or file name as it appears in the hashes file")
+    p.add_argument('-c', '--column', default='combined', help="hash column, or 'combined' for all weighted")
+    p.add_argument('-k', type=int, default=20)
+    p.add_argument('-o', '--output', default='-')
+    p.add_argument('-f', '--format', choices=('text', 'csv', 'json'), default='text')
+    p.set_defaults(func=cmd_query)
+
+    p = commands.add_parser('cluster', help="groups of near-duplicate images from a hashes file")
+    p.add_argument('hashes', help="hashes CSV or .hashstore")
+    p.add_argument('-c', '--columns', help="comma-separated hash columns (default: all)")
+    p.add_argument('-t', '--threshold', type=int, default=6, help="max Hamming distance")
+    p.add_argument('-o', '--output', default='-')
+    p.add_argument('-f', '--format', choices=('text', 'csv', 'json'), default='text')
+    p.set_defaults(func=cmd_cluster)
+
+    p = commands.add_parser('dedup', help="byte-identical files (report only, nothing is deleted)")
+    p.add_argument('folders', nargs='+')
+    p.add_argument('-r', '--recursive', action='store_true')
+    p.add_argument('-w', '--workers', type=int)
+    p.add_argument('-o', '--output', default='-')
+    p.add_argument('-f', '--format', choices=('text', 'csv', 'json'), default='text')
+    p.set_defaults(func=cmd_dedup)
+
+    # Sharded runs: split a file list, hash each shard anywhere, merge the results
+    p = commands.add_parser('split', help="split a file list into shards by path hash and write a manifest")
+    p.add_argument('list', help="one-column CSV of file paths")
+    p.add_argument('-n', '--shards', type=int, required=True)
+    p.add_argument('-a', '--algorithms', type=parse_algorithms, default=list(ALGORITHM_NAMES.values()))
+    p.add_argument('--fast-decode', action='store_true')
+    p.add_argument('-m', '--manifest', help="manifest path (default: beside the list, .shards.json)")
+    p.set_defaults(func=cmd_split)
+
+    p = commands.add_parser('hash-shard', help="hash one shard of a manifest in place")
+    p.add_argument('manifest')
+    p.add_argument('index', type=int)
+    p.add_argument('--decode-threads', type=int, default=max(1, (os.cpu_count() or 4) // 2))
+    p.add_argument('--hash-threads', type=int, default=os.cpu_count() or 4)
+    p.add_argument('--no-cache', action='store_true')
+    p.add_argument('--profile', help="write per-stage timings to this JSON file")
+    p.set_defaults(func=cmd_hash_shard)
+
+    p = commands.add_parser('merge', help="merge hashed shards (a manifest) or hashed lists, sorted and de-duplicated")
+    p.add_argument('inputs', nargs='+', help="a .shards.json manifest, or hashed CSVs")
+    p.add_argument('-o', '--output', required=True)
+    p.add_argument('-a', '--algorithms', default=','.join(ALGORITHM_NAMES),
+                   help="hash columns of the CSVs when no manifest is given")
+    p.add_argument('--no-store', dest='store', action='store_false', help="skip the .hashstore beside the output")
+    p.add_argument('--run-rows', type=int, default=200000, help="rows sorted in memory at a time")
+    p.add_argument('--temp-dir', help="where sorted runs are spilled")
+    p.set_defaults(func=cmd_merge)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    started = time.perf_counter()
+    status = args.func(args)
+    if not args.quiet:
+        print(f"{args.command} finished in {time.perf_counter() - started:.1f} s", file=sys.stderr)
+    return status
+
+
+# Process-pool workers import this module, so only run from the command line
+if __name__ == "__main__":
+    sys.exit(main())
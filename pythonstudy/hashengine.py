@@ -0,0 +1,314 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+import numpy as np
+import imagehash
+from PIL import Image
+from fastdecode import decode_reduced, min_side_size
+from stats import NO_STATS, Stats
+
+# CSV column name -> imagehash function, in the column order the hashing tools write
+ALGORITHMS = {
+    'Average Hash': imagehash.average_hash,
+    'Perceptual Hash': imagehash.phash,
+    'Difference Hash': imagehash.dhash,
+    'Wavelet Hash': imagehash.whash,
+    'Color Hash': imagehash.colorhash,
+}
+
+# Hex digits per hash with the default sizes: 8x8 bits, color hash 14 bins x 3 bits
+HEX_WIDTH = {
+    'Average Hash': 16,
+    'Perceptual Hash': 16,
+    'Difference Hash': 16,
+    'Wavelet Hash': 16,
+    'Color Hash': 11,
+}
+
+CSV_FIELDNAMES = ['Image'] + list(ALGORITHMS)
+
+BACKENDS = ('thread', 'process')
+
+# imagehash defaults
+HASH_SIZE = 8
+HIGHFREQ_FACTOR = 4
+COLOR_BINBITS = 3
+
+# Shorter side the fast-decode mode asks the decoder for (0 = always decode full size)
+FAST_DECODE_MIN_SIDE = 256
+
+
+def bits_to_int(bits):
+    """Boolean hash bits as one integer, same value as int(str(ImageHash(bits)), 16)"""
+    bits = np.asarray(bits).flatten()
+    pad = (-bits.size) % 8
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big') >> pad
+
+
+def hash_to_int(image_hash):
+    return bits_to_int(image_hash.hash)
+
+
+def _whash_scale(size):
+    natural_scale = 2**int(np.log2(min(size)))
+    return max(natural_scale, HASH_SIZE)
+
+
+def thumbnail_sizes(image_size, algorithms):
+    """(width, height) of every grayscale thumbnail the algorithms resize to"""
+    sizes = {}
+    if 'Average Hash' in algorithms:
+        sizes['Average Hash'] = (HASH_SIZE, HASH_SIZE)
+    if 'Perceptual Hash' in algorithms:
+        sizes['Perceptual Hash'] = (HASH_SIZE * HIGHFREQ_FACTOR, HASH_SIZE * HIGHFREQ_FACTOR)
+    if 'Difference Hash' in algorithms:
+        sizes['Difference Hash'] = (HASH_SIZE + 1, HASH_SIZE)
+    if 'Wavelet Hash' in algorithms:
+        scale = _whash_scale(image_size)
+        sizes['Wavelet Hash'] = (scale, scale)
+    return sizes
+
+
+def preprocess(img, algorithms):
+    """Decode and convert to grayscale once, then build each thumbnail the algorithms need.
+
+    Every thumbnail is resized from the same full-resolution grayscale image
+    with the filter imagehash uses, so the hashes stay bit-identical.
+    """
+    img.load()
+    gray = img.convert('L')
+    thumbnails = {}
+    for size in set(thumbnail_sizes(img.size, algorithms).values()):
+        thumbnails[size] = np.asarray(gray.resize(size, imagehash.ANTIALIAS))
+    stage = {'size': img.size, 'thumbnails': thumbnails}
+    if 'Color Hash' in algorithms:
+        stage['intensity'] = np.asarray(gray).flatten()
+        stage['hsv'] = [np.asarray(v).flatten() for v in img.convert('HSV').split()]
+    return stage
+
+
+def _average_bits(pixels):
+    return pixels > np.mean(pixels)
+
+
+def _perceptual_bits(pixels):
+    import scipy.fftpack
+    dct = scipy.fftpack.dct(scipy.fftpack.dct(pixels, axis=0), axis=1)
+    dctlowfreq = dct[:HASH_SIZE, :HASH_SIZE]
+    return dctlowfreq > np.median(dctlowfreq)
+
+
+def _difference_bits(pixels):
+    return pixels[:, 1:] > pixels[:, :-1]
+
+
+def _wavelet_bits(pixels):
+    import pywt
+    ll_max_level = int(np.log2(pixels.shape[0]))
+    dwt_level = ll_max_level - int(np.log2(HASH_SIZE))
+    pixels = pixels / 255.
+    # Remove the lowest Haar LL band, then hash LL(log2 hash_size)
+    coeffs = list(pywt.wavedec2(pixels, 'haar', level=ll_max_level))
+    coeffs[0] *= 0
+    pixels = pywt.waverec2(coeffs, 'haar')
+    dwt_low = pywt.wavedec2(pixels, 'haar', level=dwt_level)[0]
+    return dwt_low > np.median(dwt_low)
+
+
+# Bin of every uint8 hue value for numpy.histogram(h, bins=numpy.linspace(0, 255, 7))
+_HUE_BIN = np.clip(np.searchsorted(np.linspace(0, 255, 6 + 1), np.arange(256), side='right') - 1, 0, 5)
+
+
+def _hue_histogram(hue):
+    return np.bincount(_HUE_BIN, weights=np.bincount(hue, minlength=256), minlength=6).astype(np.int64)
+
+
+def _color_bits(intensity, hsv):
+    # Same binning as imagehash.colorhash, on the shared grayscale and HSV planes
+    h, s, v = hsv
+    mask_black = intensity < 256 // 8
+    frac_black = mask_black.mean()
+    mask_gray = s < 256 // 3
+    frac_gray = np.logical_and(~mask_black, mask_gray).mean()
+    mask_colors = np.logical_and(~mask_black, ~mask_gray)
+    mask_faint_colors = np.logical_and(mask_colors, s < 256 * 2 // 3)
+    mask_bright_colors = np.logical_and(mask_colors, s > 256 * 2 // 3)
+
+    c = max(1, mask_colors.sum())
+    # Hue is uint8, so counting each value once and mapping it to its bin
+    # gives the same counts as numpy.histogram without sorting the pixels
+    h_faint_counts = _hue_histogram(h[mask_faint_colors])
+    h_bright_counts = _hue_histogram(h[mask_bright_colors])
+
+    maxvalue = 2**COLOR_BINBITS
+    values = [min(maxvalue - 1, int(frac_black * maxvalue)), min(maxvalue - 1, int(frac_gray * maxvalue))]
+    for counts in list(h_faint_counts) + list(h_bright_counts):
+        values.append(min(maxvalue - 1, int(counts * maxvalue * 1. / c)))
+    bits = []
+    for value in values:
+        bits += [value // (2**(COLOR_BINBITS - i - 1)) % 2**(COLOR_BINBITS - i) > 0 for i in range(COLOR_BINBITS)]
+    return np.asarray(bits)
+
+
+_THUMBNAIL_BITS = {
+    'Average Hash': _average_bits,
+    'Perceptual Hash': _perceptual_bits,
+    'Difference Hash': _difference_bits,
+    'Wavelet Hash': _wavelet_bits,
+}
+
+
+def compute_hashes(img, algorithms, stats=NO_STATS):
+    """Every requested hash of an opened image as ints, from one shared preprocessing stage"""
+    with stats.timer('decode'):
+        img.load()
+    with stats.timer('preprocess'):
+        stage = preprocess(img, algorithms)
+    sizes = thumbnail_sizes(stage['size'], algorithms)
+    values = []
+    for name in algorithms:
+        with stats.timer('hash.' + name):
+            if name == 'Color Hash':
+                bits = _color_bits(stage['intensity'], stage['hsv'])
+            else:
+                bits = _THUMBNAIL_BITS[name](stage['thumbnails'][sizes[name]])
+            values.append(bits_to_int(bits))
+    return tuple(values)
+
+
+def to_hex(value, algorithm):
+    return format(value, f'0{HEX_WIDTH[algorithm]}x')
+
+
+def open_for_hashing(file_path, fast_decode=0):
+    """Open an image, decoded at reduced size when fast_decode is a minimum shorter side"""
+    img = Image.open(file_path)
+    if fast_decode:
+        img = decode_reduced(img, min_side_size(img.size, fast_decode))
+    return img
+
+
+def hash_file(file_path, algorithms, fast_decode=0, stats=NO_STATS):
+    """(file_path, (int, ...)) with one value per algorithm, or (file_path, None) on error"""
+    stats.count('images')
+    try:
+        with stats.timer('open'):
+            img = open_for_hashing(file_path, fast_decode)
+        with img:
+            return file_path, compute_hashes(img, algorithms, stats)
+    except Exception as e:
+        stats.count('errors')
+        print(f"Error processing {file_path}: {e}")
+        return file_path, None
+
+
+def hash_chunk(file_paths, algorithms, fast_decode=0, stats=NO_STATS):
+    # One task per chunk keeps pickling and scheduling cost low for process workers
+    return [hash_file(file_path, algorithms, fast_decode, stats) for file_path in file_paths]
+
+
+def _profiled_chunk(chunk_function, file_paths, algorithms, fast_decode):
+    # Each task records into its own Stats and returns it with the results, so
+    # process workers report too and the caller merges every chunk exactly once
+    stats = Stats()
+    results = chunk_function(file_paths, algorithms, fast_decode, stats)
+    return results, stats.export()
+
+
+def decode_drift(file_paths, algorithms, fast_decode=FAST_DECODE_MIN_SIDE):
+    """Compare fast-decode hashes with full-decode hashes, per algorithm.
+
+    Returns {algorithm: {'files', 'changed', 'mean', 'max'}} where mean and
+    max are Hamming distances, so each algorithm can be accepted or not.
+    """
+    algorithms = list(algorithms)
+    report = {name: {'files': 0, 'changed': 0, 'mean': 0.0, 'max': 0} for name in algorithms}
+    for file_path in file_paths:
+        _, full = hash_file(file_path, algorithms)
+        _, fast = hash_file(file_path, algorithms, fast_decode)
+        if full is None or fast is None:
+            continue
+        for name, a, b in zip(algorithms, full, fast):
+            distance = bin(a ^ b).count('1')
+            stats = report[name]
+            stats['files'] += 1
+            stats['changed'] += distance > 0
+            stats['max'] = max(stats['max'], distance)
+            stats['mean'] += (distance - stats['mean']) / stats['files']
+    return report
+
+
+def hash_row(file_path, algorithms, values, full_path=False):
+    """CSV row dict with hex hashes, as the hashing tools write it"""
+    hash_values = {'Image': os.path.abspath(file_path) if full_path else os.path.basename(file_path)}
+    if values is not None:
+        hash_values.update((name, to_hex(value, name)) for name, value in zip(algorithms, values))
+    return hash_values
+
+
+def generate_hashes(file_path, algorithms):
+    """Hex hashes of one file as a CSV row dict"""
+    return hash_row(file_path, algorithms, hash_file(file_path, algorithms)[1])
+
+
+def hash_files(file_paths, algorithms, backend='process', workers=None, chunk_size=32, fast_decode=0,
+                batched=False, stats=None, lookup=None):
+    """Hash files on a thread or process pool, yielding (file_path, values) as chunks finish.
+
+    file_paths may be any iterable; at most two chunks per worker are in
+    flight, so memory stays flat however long the input is. With batched,
+    each chunk is hashed by the NumPy batch kernels in batchhash, so larger
+    chunks spread the per-call overhead over more images.
+    With stats, per-stage timings from every worker are merged into it as
+    each chunk finishes. With lookup, lookup(file_path) is tried first for
+    every file; when it returns values they are yielded straight away, in
+    input order, and the file never goes to the pool.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend}")
+    workers = workers or os.cpu_count() or 1
+    algorithms = list(algorithms)
+    if batched:
+        from batchhash import hash_chunk_batched as chunk_function
+    else:
+        chunk_function = hash_chunk
+    executor_class = ProcessPoolExecutor if backend == 'process' else ThreadPoolExecutor
+
+    def results(future):
+        if stats is None:
+            return future.result()
+        chunk_results, exported = future.result()
+        stats.merge(exported)
+        return chunk_results
+
+    def submit(executor, chunk):
+        if stats is None:
+            return executor.submit(chunk_function, chunk, algorithms, fast_decode)
+        return executor.submit(_profiled_chunk, chunk_function, chunk, algorithms, fast_decode)
+
+    with executor_class(max_workers=workers) as executor:
+        pending = set()
+        chunk = []
+        for file_path in file_paths:
+            if lookup is not None:
+                values = lookup(file_path)
+                if values is not None:
+                    yield file_path, values
+                    # Long runs of hits must not hold back chunks that are already done
+                    done = {future for future in pending if future.done()}
+                    pending -= done
+                    for future in done:
+                        yield from results(future)
+                    continue
+            chunk.append(file_path)
+            if len(chunk) < chunk_size:
+                continue
+            pending.add(submit(executor, chunk))
+            chunk = []
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from results(future)
+        if chunk:
+            pending.add(submit(executor, chunk))
+        for future in as_completed(pending):
+            yield from results(future)
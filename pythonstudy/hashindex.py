@@ -0,0 +1,374 @@
+import os
+from functools import lru_cache
+import numpy as np
+
+# Each uint64 word holds 16 hex characters
+HEX_PER_WORD = 16
+
+# Multi-index hashing splits every word into four 16-bit substrings
+CHUNK_BITS = 16
+CHUNKS_PER_WORD = 64 // CHUNK_BITS
+# Beyond this substring radius the probe count grows too fast and a linear scan wins
+MAX_CHUNK_RADIUS = 3
+
+INDEX_SUFFIX = ".index.npz"
+
+# Relative weight of each hash in combined queries; other column names weigh 1
+HASH_WEIGHTS = {
+    "Perceptual Hash": 3,
+    "Difference Hash": 3,
+    "Wavelet Hash": 2,
+    "Average Hash": 1,
+    "Color Hash": 1,
+}
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(words):
+    """Count set bits per row of a uint64 array"""
+    if hasattr(np, "bitwise_count"):
+        counts = np.bitwise_count(words)
+    else:
+        counts = _POPCOUNT8[words.view(np.uint8)].reshape(words.shape + (8,)).sum(axis=-1)
+    if counts.ndim > 1:
+        return counts.sum(axis=-1, dtype=np.int64)
+    return counts.astype(np.int64)
+
+
+def hex_to_words(hex_str, n_words):
+    """Split a hex hash string into n_words uint64 values"""
+    hex_str = str(hex_str).strip().lower()
+    hex_str = hex_str.rjust(n_words * HEX_PER_WORD, "0")
+    return [int(hex_str[i:i + HEX_PER_WORD], 16) for i in range(0, n_words * HEX_PER_WORD, HEX_PER_WORD)]
+
+
+def pack_hashes(hex_values):
+    """Pack a column of hex hashes into an (N, W) uint64 array plus a validity mask"""
+    hex_values = ["" if v is None else str(v).strip() for v in hex_values]
+    width = max((len(v) for v in hex_values), default=0)
+    n_words = max(1, -(-width // HEX_PER_WORD))
+    packed = np.zeros((len(hex_values), n_words), dtype=np.uint64)
+    valid = np.zeros(len(hex_values), dtype=bool)
+    for i, value in enumerate(hex_values):
+        if not value or value.lower() == "nan":
+            continue
+        try:
+            packed[i] = hex_to_words(value, n_words)
+            valid[i] = True
+        except ValueError:
+            pass
+    return packed, valid
+
+
+@lru_cache(maxsize=None)
+def _chunk_masks(radius):
+    """All 16-bit XOR masks with at most radius bits set, fewest bits first"""
+    masks = np.arange(1 << CHUNK_BITS, dtype=np.uint32)
+    bits = _POPCOUNT8[masks & 0xFF] + _POPCOUNT8[masks >> 8]
+    masks = masks[bits <= radius]
+    return masks[np.argsort(bits[bits <= radius], kind="stable")]
+
+
+def column_bits(packed, valid):
+    """Bits a column's hashes actually use, rounded up to whole hex digits"""
+    if valid.any():
+        used = np.bitwise_or.reduce(packed[valid], axis=0).tolist()
+        for j, word in enumerate(used):
+            if word:
+                bits = (packed.shape[1] - 1 - j) * 64 + word.bit_length()
+                return -(-bits // 4) * 4
+    return packed.shape[1] * 64
+
+
+def _chunks(words, j):
+    """The j-th 16-bit substring of each packed hash"""
+    word, part = divmod(j, CHUNKS_PER_WORD)
+    shift = np.uint64(CHUNK_BITS * (CHUNKS_PER_WORD - 1 - part))
+    return ((words[..., word] >> shift) & np.uint64(0xFFFF)).astype(np.int64)
+
+
+class MultiIndexHash:
+    """Multi-index hashing over one packed hash column.
+
+    Every hash is cut into m 16-bit substrings with one lookup table each.
+    Two hashes within distance r agree on at least one substring to within
+    r // m bits, so a radius query only has to probe a few table buckets.
+    """
+
+    def __init__(self, packed, valid, tables=None):
+        self.packed = packed
+        self.valid = valid
+        self.m = packed.shape[1] * CHUNKS_PER_WORD
+        if tables is None:
+            tables = [self._build_table(j) for j in range(self.m)]
+        # tables[j] = (starts, rows): rows[starts[v]:starts[v + 1]] hold substring value v
+        self.tables = tables
+
+    def _build_table(self, j):
+        rows = np.flatnonzero(self.valid)
+        keys = _chunks(self.packed[rows], j)
+        order = np.argsort(keys, kind="stable")
+        starts = np.zeros((1 << CHUNK_BITS) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=1 << CHUNK_BITS), out=starts[1:])
+        return starts, rows[order]
+
+    def candidates(self, query_words, chunk_radius):
+        """Rows sharing a substring with the query to within chunk_radius bits"""
+        masks = _chunk_masks(chunk_radius)
+        found = []
+        for j, (starts, rows) in enumerate(self.tables):
+            values = _chunks(query_words, j) ^ masks
+            lo = starts[values]
+            counts = starts[values + 1] - lo
+            total = int(counts.sum())
+            if total:
+                # Gather every probed bucket slice in one fancy-indexing step
+                offsets = np.repeat(lo - np.cumsum(counts) + counts, counts)
+                found.append(rows[offsets + np.arange(total)])
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(found))
+
+    def within(self, query_words, radius):
+        """[(distance, row), ...] for every row within radius, or None if too wide to probe"""
+        chunk_radius = radius // self.m
+        if chunk_radius > MAX_CHUNK_RADIUS:
+            return None
+        rows = self.candidates(query_words, chunk_radius)
+        dist = popcount(np.bitwise_xor(self.packed[rows], query_words))
+        keep = dist <= radius
+        rows, dist = rows[keep], dist[keep]
+        order = np.lexsort((rows, dist))
+        return [(int(dist[i]), int(rows[i])) for i in order]
+
+    def nearest(self, query_words, k):
+        """k closest rows, or None when the search would degrade to a full scan"""
+        total = int(self.valid.sum())
+        for chunk_radius in range(MAX_CHUNK_RADIUS + 1):
+            # Every row within this radius is guaranteed to be among the candidates
+            radius = self.m * (chunk_radius + 1) - 1
+            rows = self.candidates(query_words, chunk_radius)
+            if rows.size > total // 4:
+                return None
+            dist = popcount(np.bitwise_xor(self.packed[rows], query_words))
+            keep = dist <= radius
+            if keep.sum() >= min(k, total):
+                rows, dist = rows[keep], dist[keep]
+                order = np.lexsort((rows, dist))[:k]
+                return [(int(dist[i]), int(rows[i])) for i in order]
+        return None
+
+
+def index_path_for(csv_path):
+    return csv_path + INDEX_SUFFIX
+
+
+def _csv_fingerprint(csv_path):
+    st = os.stat(csv_path)
+    return np.array([st.st_size, st.st_mtime_ns], dtype=np.int64)
+
+
+class HashIndex:
+    """Hash columns packed once at load time; queries use vectorized Hamming distance"""
+
+    def __init__(self, columns, names=None):
+        # columns: one list of hex strings per hash column
+        self.names = list(names) if names is not None else [str(i) for i in range(len(columns))]
+        self.packed = []
+        self.valid = []
+        for values in columns:
+            packed, valid = pack_hashes(values)
+            self.packed.append(packed)
+            self.valid.append(valid)
+        self.size = len(self.valid[0]) if self.valid else 0
+        self.mih = None
+        self.bits = {}
+
+    def build_mih(self):
+        """Build the multi-index hashing tables used for sublinear lookups"""
+        self.mih = [MultiIndexHash(packed, valid) for packed, valid in zip(self.packed, self.valid)]
+        return self
+
+    def save(self, path, csv_path=None):
+        """Write packed columns and lookup tables to an .npz next to the CSV"""
+        if self.mih is None:
+            self.build_mih()
+        arrays = {"names": np.array(self.names, dtype=str)}
+        if csv_path is not None:
+            arrays["fingerprint"] = _csv_fingerprint(csv_path)
+        for c, mih in enumerate(self.mih):
+            arrays[f"packed_{c}"] = self.packed[c]
+            arrays[f"valid_{c}"] = self.valid[c]
+            for j, (starts, rows) in enumerate(mih.tables):
+                arrays[f"starts_{c}_{j}"] = starts
+                arrays[f"rows_{c}_{j}"] = rows
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, csv_path=None):
+        """Load a saved index, or None if it is missing or older than the CSV"""
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as saved:
+            if csv_path is not None:
+                if "fingerprint" not in saved or not np.array_equal(saved["fingerprint"], _csv_fingerprint(csv_path)):
+                    return None
+            index = cls([], [str(n) for n in saved["names"]])
+            index.mih = []
+            for c in range(len(index.names)):
+                packed, valid = saved[f"packed_{c}"], saved[f"valid_{c}"]
+                tables = [(saved[f"starts_{c}_{j}"], saved[f"rows_{c}_{j}"])
+                          for j in range(packed.shape[1] * CHUNKS_PER_WORD)]
+                index.packed.append(packed)
+                index.valid.append(valid)
+                index.mih.append(MultiIndexHash(packed, valid, tables))
+        index.size = len(index.valid[0]) if index.valid else 0
+        return index
+
+    @classmethod
+    def open_for_csv(cls, csv_path, data):
+        """Reuse the index saved next to csv_path, rebuilding it when the CSV changed"""
+        return cls._open_cached(csv_path, len(data), lambda: cls.from_frame(data))
+
+    @classmethod
+    def open_for_store(cls, store):
+        """Same as open_for_csv for a hashstore.HashStore"""
+        return cls._open_cached(store.store_path, store.size, store.hash_index)
+
+    @classmethod
+    def _open_cached(cls, source_path, size, build):
+        path = index_path_for(source_path)
+        try:
+            index = cls.load(path, source_path)
+        except (OSError, ValueError, KeyError):
+            index = None
+        if index is None or index.size != size:
+            index = build().build_mih()
+            try:
+                index.save(path, source_path)
+            except OSError as e:
+                print(f"Error saving index {path}: {e}")
+        return index
+
+    @classmethod
+    def from_frame(cls, data, first_column=1):
+        # First CSV column is the image path, the rest are hash columns
+        names = list(data.columns[first_column:])
+        columns = [data.iloc[:, i].tolist() for i in range(first_column, data.shape[1])]
+        return cls(columns, names)
+
+    @classmethod
+    def from_packed(cls, packed, valid, names):
+        # Columns that are already (N, W) uint64 arrays, e.g. from a hash store
+        index = cls([], names)
+        index.packed = list(packed)
+        index.valid = list(valid)
+        index.size = len(index.valid[0]) if index.valid else 0
+        return index
+
+    def column_bits(self, column):
+        if column not in self.bits:
+            self.bits[column] = column_bits(self.packed[column], self.valid[column])
+        return self.bits[column]
+
+    def _query_words(self, column, query):
+        packed = self.packed[column]
+        if isinstance(query, (int, np.integer)):
+            return packed[query]
+        return np.array(hex_to_words(query, packed.shape[1]), dtype=np.uint64)
+
+    def within(self, column, query, radius):
+        """All rows within Hamming radius of the query as [(distance, row), ...]"""
+        query_words = self._query_words(column, query)
+        if self.mih is not None:
+            result = self.mih[column].within(query_words, radius)
+            if result is not None:
+                return result
+        dist = self.distances(column, query_words)
+        rows = np.flatnonzero((dist >= 0) & (dist <= radius))
+        rows = rows[np.lexsort((rows, dist[rows]))]
+        return [(int(dist[r]), int(r)) for r in rows]
+
+    def distances(self, column, query):
+        """Hamming distance from query to every row of a column, -1 for invalid rows"""
+        if isinstance(query, np.ndarray):
+            query_words = query
+        else:
+            query_words = self._query_words(column, query)
+        dist = popcount(np.bitwise_xor(self.packed[column], query_words))
+        dist[~self.valid[column]] = -1
+        return dist
+
+    def nearest(self, column, query, k=20):
+        """k closest rows as [(distance, row), ...] sorted by distance"""
+        query_words = self._query_words(column, query)
+        if self.mih is not None:
+            result = self.mih[column].nearest(query_words, k)
+            if result is not None:
+                return result
+        dist = self.distances(column, query_words)
+        candidates = np.flatnonzero(dist >= 0)
+        if candidates.size == 0:
+            return []
+        k = min(k, candidates.size)
+        cand_dist = dist[candidates]
+        if k < candidates.size:
+            # Partial selection of the k-th distance, then keep ties in row order
+            kth = cand_dist[np.argpartition(cand_dist, k - 1)[k - 1]]
+            closer = candidates[cand_dist < kth]
+            ties = candidates[cand_dist == kth][:k - closer.size]
+            rows = np.concatenate([closer, ties])
+        else:
+            rows = candidates
+        # Only the k selected results get sorted
+        rows = rows[np.lexsort((rows, dist[rows]))]
+        return [(int(dist[r]), int(r)) for r in rows]
+
+    def _weighted(self, column, rows, query_words, scale, partial):
+        # partial + scale * distance, with a missing hash counted as all bits different
+        dist = popcount(np.bitwise_xor(self.packed[column][rows], query_words))
+        dist = np.where(self.valid[column][rows], dist, self.column_bits(column))
+        return partial + dist * scale
+
+    def combined_nearest(self, row, k=20, weights=None):
+        """k rows closest to row over several hash columns as [(score, row), ...].
+
+        The score is the weighted mean of each column's distance as a fraction
+        of its bits, so 0 is identical and 1 is every bit different. Columns
+        where row itself has no hash are left out. The column with the most
+        weight per bit goes first; after each column, rows whose partial score
+        already exceeds the full score of the best k candidates so far are
+        dropped, so later columns are only compared for the survivors.
+        """
+        if weights is None:
+            weights = [HASH_WEIGHTS.get(name, 1) for name in self.names]
+        columns = [c for c in range(len(self.names)) if weights[c] > 0 and self.valid[c][row]]
+        if not columns or self.size == 0:
+            return []
+        total_weight = float(sum(weights[c] for c in columns))
+        scales = {c: weights[c] / (self.column_bits(c) * total_weight) for c in columns}
+        columns.sort(key=lambda c: -scales[c] / self.packed[c].shape[1])
+        query_words = {c: self.packed[c][row] for c in columns}
+
+        rows = np.arange(self.size)
+        partial = np.zeros(self.size)
+        for i, column in enumerate(columns):
+            partial = self._weighted(column, rows, query_words[column], scales[column], partial)
+            remaining = columns[i + 1:]
+            if not remaining or rows.size <= k:
+                continue
+            # Finishing the k best partial scores bounds the final k-th best score from above.
+            # Scores are summed in the same column order for every row, so ties compare exactly
+            best = np.argpartition(partial, k - 1)[:k]
+            bound = partial[best]
+            for other in remaining:
+                bound = self._weighted(other, rows[best], query_words[other], scales[other], bound)
+            keep = partial <= bound.max()
+            rows, partial = rows[keep], partial[keep]
+
+        order = np.lexsort((rows, partial))[:k]
+        return [(float(partial[i]), int(rows[i])) for i in order]
@@ -0,0 +1,244 @@
+import csv
+import os
+import time
+from datetime import datetime
+from scanner import IMAGE_EXTENSIONS, DirectoryScanner
+from stats import NO_STATS
+
+# Hashing, similarity queries and duplicate clustering with no GUI involved.
+# The Tk tools and hashcli.py are both front ends over these functions.
+# numpy, PIL, imagehash and pandas are imported inside the jobs that use them,
+# so the command line starts quickly and a query never loads the image stack.
+
+# Progress callbacks fire at most this often, plus once when a job ends
+PROGRESS_INTERVAL = 0.1
+
+
+def find_images(sources, recursive=True, extensions=IMAGE_EXTENSIONS, stats=NO_STATS):
+    """Image paths from a mix of files and folders; folders are walked in parallel when recursive"""
+    for source in sources:
+        if not os.path.isdir(source):
+            yield source
+        elif recursive:
+            yield from DirectoryScanner(source, extensions, stats=stats)
+        else:
+            for name in sorted(os.listdir(source)):
+                path = os.path.join(source, name)
+                if name.lower().endswith(extensions) and os.path.isfile(path):
+                    yield path
+
+
+def write_file_list(file_paths, path=None):
+    """One-column CSV of file paths, named after the current time by default; returns its path"""
+    path = path or datetime.now().strftime('%Y%m%d%H%M%S') + ".csv"
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        for file_path in file_paths:
+            writer.writerow([file_path])
+    return path
+
+
+def _throttled(progress):
+    # progress limited to one call per PROGRESS_INTERVAL, except when forced
+    last = [0.0]
+
+    def report(*args, force=False):
+        now = time.monotonic()
+        if progress is not None and (force or now - last[0] > PROGRESS_INTERVAL):
+            last[0] = now
+            progress(*args)
+    return report
+
+
+def hash_images(file_paths, algorithms, csv_path='hashes.csv', store_path='hashes.hashstore', append=True,
+                full_path=False, keep_errors=False, cache=None, stats=None, progress=None, **options):
+    """Hash file_paths on a worker pool and write the rows to csv_path and store_path.
+
+    Either output may be None. With cache (a hashcache.HashCache) unchanged
+    files are not hashed again. options go to hashengine.hash_files: backend,
+    workers, chunk_size, fast_decode and batched. Files that fail are left
+    out unless keep_errors, which writes their path with empty hashes.
+    progress(processed) is called from this thread. Returns the file count.
+    """
+    from hashengine import ALGORITHMS, CSV_FIELDNAMES, HEX_WIDTH, hash_files, hash_row
+    from hashcache import hash_files_cached
+    from csvwriter import CSVWriterThread
+    from hashstore import HashStoreWriter
+    algorithms = list(algorithms)
+    timers = stats if stats is not None else NO_STATS
+    writer = CSVWriterThread(csv_path, CSV_FIELDNAMES, append=append, stats=timers) if csv_path else None
+    # The store always has every column, so runs with different algorithms can share one file
+    store = (HashStoreWriter(store_path, list(ALGORITHMS), [HEX_WIDTH[name] for name in ALGORITHMS], append=append)
+             if store_path else None)
+    if cache is not None:
+        results = hash_files_cached(file_paths, algorithms, cache, stats=stats, **options)
+    else:
+        results = hash_files(file_paths, algorithms, stats=stats, **options)
+    report = _throttled(progress)
+    processed = 0
+    try:
+        for file_path, values in results:
+            if values is not None or keep_errors:
+                with timers.timer('store.append'):
+                    row = hash_row(file_path, algorithms, values, full_path)
+                    if writer is not None:
+                        writer.write(row)
+                    if store is not None:
+                        store.append(row['Image'], dict(zip(algorithms, values or ())))
+            processed += 1
+            timers.count('done')
+            report(processed)
+    finally:
+        # The store is closed even when closing the CSV fails
+        try:
+            if writer is not None:
+                writer.close()
+        finally:
+            if store is not None:
+                store.close()
+    report(processed, force=True)
+    return processed
+
+
+def hash_file_list(list_path, algorithms, fast_decode=0, decode_threads=4, hash_threads=4, store_path=None,
+                   cache=None, stats=None, progress=None):
+    """Hash every file named in a one-column CSV, appending the hex hashes to its rows in place.
+
+    Files stream through decode and hash stages joined by bounded queues, so
+    memory does not grow with the list. The same values go to store_path
+    (by default next to the list, with the .hashstore suffix). With cache,
+    unchanged files skip both stages. progress(done, found) is called from
+    this thread, where done counts files that failed as well. Returns the
+    number of rows written. If the run fails, the list and its store are
+    left as they were.
+    """
+    from hashengine import HEX_WIDTH, compute_hashes, open_for_hashing, to_hex
+    from csvwriter import CSVWriterThread
+    from hashstore import HashStoreWriter, store_path_for
+    from pipeline import Stage, run_pipeline
+    algorithms = list(algorithms)
+    timers = stats if stats is not None else NO_STATS
+    counter = {'found': 0, 'done': 0, 'failed': 0}
+    report = _throttled(progress)
+
+    # Items are (file path, decoded image, hash values); values are already set on a cache hit,
+    # and a file that failed travels on as (file path, None, None) so it still counts as completed
+    def enumerate_files():
+        with open(list_path, 'r', encoding='utf-8') as file:
+            for row in csv.reader(file):
+                if not row:
+                    continue
+                counter['found'] += 1
+                yield row[0], None, cache.get(row[0], algorithms, fast_decode) if cache is not None else None
+
+    def decode_image(item):
+        file_path, image, values = item
+        if values is not None:
+            return item
+        try:
+            image = open_for_hashing(file_path, fast_decode)
+            image.load()
+        except Exception as e:
+            print(f"Error processing {file_path}: {e}")
+            return file_path, None, None
+        return file_path, image, None
+
+    # The image is decoded and converted to grayscale once for all the algorithms
+    def hash_image(item):
+        file_path, image, values = item
+        if values is not None or image is None:
+            return item
+        with image:
+            try:
+                return file_path, None, compute_hashes(image, algorithms)
+            except Exception as e:
+                print(f"Error processing {file_path}: {e}")
+                return file_path, None, None
+
+    # Results go to a temporary file that replaces the list at the end, since the list is still being read
+    output_path = list_path + ".tmp"
+    writer = CSVWriterThread(output_path, stats=timers)
+    store = HashStoreWriter(store_path or store_path_for(list_path), algorithms, [HEX_WIDTH[name] for name in algorithms])
+
+    def write_result(item):
+        file_path, _, values = item
+        if values is None:
+            counter['failed'] += 1
+            timers.count('done')
+            timers.count('errors')
+            report(counter['done'] + counter['failed'], counter['found'])
+            return
+        writer.write([file_path] + [to_hex(value, name) for value, name in zip(values, algorithms)])
+        store.append(file_path, dict(zip(algorithms, values)))
+        if cache is not None:
+            cache.put(file_path, algorithms, values, fast_decode)
+        counter['done'] += 1
+        timers.count('done')
+        report(counter['done'] + counter['failed'], counter['found'])
+
+    # Each stage buffers at most twice its thread count of images
+    stages = [Stage("decode", decode_image, decode_threads), Stage("hash", hash_image, hash_threads)]
+    try:
+        try:
+            run_pipeline(enumerate_files(), stages, write_result, queue_size=2 * max(decode_threads, hash_threads),
+                         stats=timers)
+        finally:
+            writer.close()
+    except BaseException:
+        # Only a complete run may replace the list; a partial one is thrown away
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    store.close()
+    os.replace(output_path, list_path)
+    report(counter['done'] + counter['failed'], counter['found'], force=True)
+    return counter['done']
+
+
+def open_hashes(path):
+    """(DataFrame of text columns, HashIndex) for a hashes CSV or .hashstore; the index is cached beside it"""
+    import pandas as pd
+    from hashindex import HashIndex
+    from hashstore import HashStore, is_store
+    if is_store(path):
+        store = HashStore(path)
+        frames = list(store.iter_frames())
+        frame = pd.concat(frames) if frames else pd.DataFrame(columns=["Image"] + store.names, dtype=str)
+        return frame, HashIndex.open_for_store(store)
+    frame = pd.read_csv(path, dtype=str, keep_default_na=False)
+    return frame, HashIndex.open_for_csv(path, frame)
+
+
+def find_row(frame, image):
+    """Row number of image in a hashes frame, matched on the full path first and then on the file name"""
+    paths = frame.iloc[:, 0]
+    for candidates in (paths == image, paths == os.path.basename(image),
+                       paths.map(os.path.basename) == os.path.basename(image)):
+        rows = candidates.to_numpy().nonzero()[0]
+        if rows.size:
+            return int(rows[0])
+    raise KeyError(image)
+
+
+def similar_images(index, row, column=None, k=20, weights=None):
+    """k rows most like row as [(score, row), ...].
+
+    With a column (position in index.names) the score is the Hamming distance
+    on that hash; without one it is the weighted score over every hash, as in
+    HashIndex.combined_nearest.
+    """
+    if column is None:
+        return index.combined_nearest(row, k, weights)
+    return index.nearest(column, row, k)
+
+
+def duplicate_groups(index, columns=None, threshold=6, progress=None):
+    """(groups, packed): near-duplicate row groups over the given hash columns (all by default).
+
+    packed holds the combined hashes the groups were found on, as
+    dupcluster.save_clusters_csv expects.
+    """
+    from dupcluster import cluster_groups, combine_columns, find_clusters
+    columns = list(range(len(index.names))) if columns is None else list(columns)
+    packed, valid = combine_columns(index, columns)
+    return cluster_groups(find_clusters(packed, valid, threshold, progress=progress)), packed
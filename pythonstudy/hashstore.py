@@ -0,0 +1,267 @@
+import json
+import os
+from array import array
+
+import numpy as np
+
+from hashindex import HEX_PER_WORD
+
+# One file per store: magic, header length, JSON header, then 64-byte aligned arrays
+STORE_SUFFIX = ".hashstore"
+MAGIC = b"HSTORE01"
+ALIGN = 64
+
+
+def store_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + STORE_SUFFIX
+
+
+def is_store(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _words(hex_width):
+    return max(1, -(-hex_width // HEX_PER_WORD))
+
+
+class HashStoreWriter:
+    """Collects (path, hashes) rows in compact arrays and writes a store file on close.
+
+    Paths are split into an interned directory table plus a per-row file name,
+    so a folder of a million images stores its directory once. Hash columns
+    are kept as uint64 words, most significant word first like hex_to_words.
+    With append=True the rows of an existing store are kept; its columns must
+    match names.
+    """
+
+    def __init__(self, path, names, hex_widths, append=False):
+        self.path = path
+        self.names = list(names)
+        self.hex_widths = [int(w) for w in hex_widths]
+        self.dirs = {}
+        self.dir_ids = array('I')
+        self.file_names = bytearray()
+        self.name_offsets = array('q', [0])
+        self.words = [[array('Q') for _ in range(_words(w))] for w in self.hex_widths]
+        self.valid = [bytearray() for _ in self.names]
+        if append and os.path.exists(path):
+            self._load_existing(HashStore(path))
+
+    def _load_existing(self, store):
+        if store.names != self.names:
+            raise ValueError(f"{self.path} has columns {store.names}, expected {self.names}")
+        self.hex_widths = [max(a, b) for a, b in zip(self.hex_widths, store.hex_widths)]
+        for path in store.paths():
+            self._add_path(path)
+        for c, (packed, valid) in enumerate(zip(store.packed, store.valid)):
+            # A wider column in either store adds leading zero words to the other one
+            width = _words(self.hex_widths[c])
+            pad = width - packed.shape[1]
+            self.words[c] = [array('Q', bytes(8 * store.size)) for _ in range(pad)] + \
+                            [array('Q', packed[:, j].tobytes()) for j in range(packed.shape[1])]
+            self.valid[c] = bytearray(valid.tobytes())
+
+    def _add_path(self, path):
+        directory, name = os.path.split(path)
+        if directory:
+            directory = os.path.join(directory, '')
+        dir_id = self.dirs.setdefault(directory, len(self.dirs))
+        self.dir_ids.append(dir_id)
+        self.file_names += name.encode('utf-8')
+        self.name_offsets.append(len(self.file_names))
+
+    def append(self, path, values):
+        """Add one row; values maps column name to an int hash, missing names are stored as invalid"""
+        self._add_path(path)
+        for c, name in enumerate(self.names):
+            value = values.get(name)
+            words = self.words[c]
+            if value is None:
+                self.valid[c].append(0)
+                for column in words:
+                    column.append(0)
+                continue
+            self.valid[c].append(1)
+            for j, column in enumerate(words):
+                shift = 64 * (len(words) - 1 - j)
+                column.append((value >> shift) & 0xFFFFFFFFFFFFFFFF)
+
+    def append_hex(self, path, hex_values):
+        """Add one row of hex strings (as in the CSVs), empty strings for missing hashes"""
+        values = {}
+        for c, (name, value) in enumerate(zip(self.names, hex_values)):
+            value = value.strip()
+            if value:
+                try:
+                    values[name] = int(value, 16)
+                except ValueError:
+                    continue
+                self.hex_widths[c] = max(self.hex_widths[c], len(value))
+                while len(self.words[c]) < _words(self.hex_widths[c]):
+                    self.words[c].insert(0, array('Q', bytes(8 * len(self.dir_ids))))
+        self.append(path, values)
+
+    def close(self):
+        rows = len(self.dir_ids)
+        dir_names = bytearray()
+        dir_offsets = array('q', [0])
+        for directory in self.dirs:
+            dir_names += directory.encode('utf-8')
+            dir_offsets.append(len(dir_names))
+
+        arrays = {
+            "dir_names": np.frombuffer(bytes(dir_names), dtype=np.uint8),
+            "dir_offsets": np.frombuffer(dir_offsets, dtype=np.int64),
+            "dir_ids": np.frombuffer(self.dir_ids, dtype=np.uint32),
+            "file_names": np.frombuffer(bytes(self.file_names), dtype=np.uint8),
+            "name_offsets": np.frombuffer(self.name_offsets, dtype=np.int64),
+        }
+        for c, words in enumerate(self.words):
+            packed = np.empty((rows, len(words)), dtype=np.uint64)
+            for j, column in enumerate(words):
+                packed[:, j] = np.frombuffer(column, dtype=np.uint64)
+            arrays[f"packed_{c}"] = packed
+            arrays[f"valid_{c}"] = np.frombuffer(bytes(self.valid[c]), dtype=np.uint8).astype(bool)
+        _write_store(self.path, arrays, {"names": self.names, "hex_widths": self.hex_widths, "rows": rows})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _write_store(path, arrays, header):
+    layout = {}
+    offset = 0
+    for name, values in arrays.items():
+        layout[name] = {"offset": offset, "dtype": values.dtype.str, "shape": list(values.shape)}
+        offset += -(-values.nbytes // ALIGN) * ALIGN
+    header = dict(header, arrays=layout)
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = -(-(len(MAGIC) + 8 + len(header_bytes)) // ALIGN) * ALIGN
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint64(data_start).tobytes())
+        f.write(header_bytes)
+        for name, values in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(np.ascontiguousarray(values).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+class HashStore:
+    """Read-only view of a store file; every array is memory-mapped, nothing is parsed up front"""
+
+    def __init__(self, path):
+        self.store_path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a hash store")
+            data_start = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+            header = json.loads(f.read(data_start - len(MAGIC) - 8).rstrip(b'\0').decode('utf-8'))
+        self.names = header["names"]
+        self.hex_widths = header["hex_widths"]
+        self.size = header["rows"]
+        self.arrays = {}
+        for name, info in header["arrays"].items():
+            shape = tuple(info["shape"])
+            if 0 in shape:
+                self.arrays[name] = np.zeros(shape, dtype=info["dtype"])
+            else:
+                self.arrays[name] = np.memmap(path, dtype=info["dtype"], mode='r',
+                                              offset=data_start + info["offset"], shape=shape)
+        self.packed = [self.arrays[f"packed_{c}"] for c in range(len(self.names))]
+        self.valid = [self.arrays[f"valid_{c}"] for c in range(len(self.names))]
+        # Directories are few, so decode them once
+        dir_names, dir_offsets = bytes(self.arrays["dir_names"]), self.arrays["dir_offsets"].tolist()
+        self.dirs = [dir_names[a:b].decode('utf-8') for a, b in zip(dir_offsets, dir_offsets[1:])]
+
+    def path(self, row):
+        offsets = self.arrays["name_offsets"]
+        name = bytes(self.arrays["file_names"][offsets[row]:offsets[row + 1]]).decode('utf-8')
+        return self.dirs[self.arrays["dir_ids"][row]] + name
+
+    def paths(self, start=0, stop=None):
+        stop = self.size if stop is None else min(stop, self.size)
+        offsets = self.arrays["name_offsets"][start:stop + 1].tolist()
+        blob = bytes(self.arrays["file_names"][offsets[0]:offsets[-1]]) if offsets else b""
+        base = offsets[0] if offsets else 0
+        dir_ids = self.arrays["dir_ids"][start:stop].tolist()
+        return [self.dirs[d] + blob[a - base:b - base].decode('utf-8')
+                for d, a, b in zip(dir_ids, offsets, offsets[1:])]
+
+    def hex_column(self, column, start=0, stop=None):
+        """Hex strings of one column for rows start:stop, empty where the hash is missing"""
+        packed = np.asarray(self.packed[column][start:stop])
+        valid = np.asarray(self.valid[column][start:stop]).tolist()
+        width = self.hex_widths[column]
+        words = [format(w, '016x') for w in packed.ravel().tolist()]
+        n_words = packed.shape[1]
+        return [''.join(words[i * n_words:(i + 1) * n_words])[-width:] if ok else ''
+                for i, ok in enumerate(valid)]
+
+    def iter_rows(self, chunk_rows=50000):
+        """[path, hex, hex, ...] per row, in store order"""
+        for start in range(0, self.size, chunk_rows):
+            columns = [self.paths(start, start + chunk_rows)] + \
+                      [self.hex_column(c, start, start + chunk_rows) for c in range(len(self.names))]
+            yield from (list(row) for row in zip(*columns))
+
+    def iter_frames(self, chunk_rows=50000, path_column="Image"):
+        """DataFrame chunks shaped like pandas.read_csv(dtype=str) on the exported CSV"""
+        import pandas as pd
+        for start in range(0, self.size, chunk_rows):
+            stop = min(self.size, start + chunk_rows)
+            frame = {path_column: self.paths(start, stop)}
+            for c, name in enumerate(self.names):
+                frame[name] = self.hex_column(c, start, stop)
+            yield pd.DataFrame(frame, index=pd.RangeIndex(start, stop), dtype=str)
+
+    def hash_index(self):
+        """HashIndex over the stored columns without going through hex strings"""
+        from hashindex import HashIndex
+        return HashIndex.from_packed([np.asarray(p) for p in self.packed],
+                                     [np.asarray(v) for v in self.valid], self.names)
+
+
+def import_csv(csv_path, store_path=None):
+    """Convert a hashes CSV (path column, then hex hash columns, with header) to a store"""
+    from csvstream import iter_rows
+    store_path = store_path or store_path_for(csv_path)
+    rows = iter_rows(csv_path)
+    header = next(rows, None)
+    if header is None:
+        raise ValueError(f"{csv_path} is empty")
+    writer = HashStoreWriter(store_path, header[1:], [0] * (len(header) - 1))
+    for row in rows:
+        if row:
+            writer.append_hex(row[0], (row[1:] + [''] * len(header))[:len(header) - 1])
+    writer.close()
+    return store_path
+
+
+def export_csv(store_path, csv_path, path_column="Image"):
+    """Write a store back out as the CSV the hashing tools produce"""
+    import csv
+    store = HashStore(store_path)
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow([path_column] + store.names)
+        writer.writerows(store.iter_rows())
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) >= 3 and sys.argv[1] == "import":
+        print(import_csv(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None))
+    elif len(sys.argv) == 4 and sys.argv[1] == "export":
+        export_csv(sys.argv[2], sys.argv[3])
+    else:
+        print("usage: hashstore.py import hashes.csv [hashes.hashstore] | export hashes.hashstore hashes.csv")
@@ -1,101 +1,177 @@
 import tkinter as tk
 from tkinter import filedialog, ttk, simpledialog
-import imagehash
-from PIL import Image
-import csv
 import os
-from concurrent.futures import ThreadPoolExecutor
-
-def select_images_or_folder():
+import threading
+from itertools import islice
+from hashengine import ALGORITHMS, FAST_DECODE_MIN_SIDE, decode_drift
+from hashcache import HashCache
+from hashjobs import hash_images
+from scanner import DirectoryScanner
+from stats import NO_STATS, Stats
+from statspanel import StatsPanel
+
+# 每次计算结束后写出各阶段耗时的JSON
+PROFILE_PATH = 'hashes_profile.json'
+
+# 快速解码偏差检查的抽样数量
+DRIFT_SAMPLE = 50
+
+def ask_file_paths(stats=NO_STATS):
+    # 文件夹用并行扫描器, 边扫描边把文件交给哈希计算
+    file_paths = []
+    folder_path = None
     if folder_var.get():
         folder_path = filedialog.askdirectory()
         if folder_path:
-            file_paths = []
-            for root, _, files in os.walk(folder_path):
-                for file in files:
-                    if file.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
-                        file_paths.append(os.path.join(root, file))
+            file_paths = DirectoryScanner(folder_path, ('.png', '.jpg', '.jpeg', '.bmp', '.gif'), stats=stats)
     else:
         file_paths = filedialog.askopenfilenames(filetypes=[("Image files", "*.png;*.jpg;*.jpeg;*.bmp;*.gif")])
+    return file_paths, folder_path
+
+def select_images_or_folder():
+    stats = Stats()
+    file_paths, folder_path = ask_file_paths(stats)
     
     if file_paths:
-        total_images.set(len(file_paths))
+        total_images.set(0 if folder_path else len(file_paths))
         processed_images.set(0)
-        with ThreadPoolExecutor(max_workers=int(thread_entry.get())) as executor:
-            list(executor.map(process_image, file_paths))
-
-def process_image(file_path):
-    hash_values = generate_hashes(file_path)
-    save_to_csv(hash_values)
-    processed_images.set(processed_images.get() + 1)
-
-def generate_hashes(file_path):
-    with Image.open(file_path) as img:
-        hash_values = {'Image': os.path.basename(file_path)}
-        if ahash_var.get():
-            hash_values['Average Hash'] = str(imagehash.average_hash(img))
-        if phash_var.get():
-            hash_values['Perceptual Hash'] = str(imagehash.phash(img))
-        if dhash_var.get():
-            hash_values['Difference Hash'] = str(imagehash.dhash(img))
-        if whash_var.get():
-            hash_values['Wavelet Hash'] = str(imagehash.whash(img))
-        if colorhash_var.get():
-            hash_values['Color Hash'] = str(imagehash.colorhash(img))
-    return hash_values
-
-def save_to_csv(hash_values):
-    with open('hashes.csv', 'a', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['Image', 'Average Hash', 'Perceptual Hash', 'Difference Hash', 'Wavelet Hash', 'Color Hash']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        if os.stat("hashes.csv").st_size == 0:
-            writer.writeheader()
-        writer.writerow(hash_values)
-
-app = tk.Tk()
-app.title("ImageHash GUI")
-
-select_button = tk.Button(app, text="选择图片/文件夹", command=select_images_or_folder)
-select_button.pack(pady=20)
-
-folder_var = tk.BooleanVar(value=False)
-tk.Checkbutton(app, text="选择文件夹", variable=folder_var).pack(anchor=tk.W)
-
-ahash_var = tk.BooleanVar(value=True)
-phash_var = tk.BooleanVar(value=True)
-dhash_var = tk.BooleanVar(value=True)
-whash_var = tk.BooleanVar(value=True)
-colorhash_var = tk.BooleanVar(value=True)
-
-tk.Checkbutton(app, text="Average Hash", variable=ahash_var).pack(anchor=tk.W)
-tk.Checkbutton(app, text="Perceptual Hash", variable=phash_var).pack(anchor=tk.W)
-tk.Checkbutton(app, text="Difference Hash", variable=dhash_var).pack(anchor=tk.W)
-tk.Checkbutton(app, text="Wavelet Hash", variable=whash_var).pack(anchor=tk.W)
-tk.Checkbutton(app, text="Color Hash", variable=colorhash_var).pack(anchor=tk.W)
-
-thread_label = tk.Label(app, text="线程数:")
-thread_label.pack(pady=5, anchor=tk.W)
-thread_entry = tk.Entry(app)
-thread_entry.pack(pady=5, anchor=tk.W, padx=20)
-thread_entry.insert(0, "4")
-
-progress = ttk.Progressbar(app, orient=tk.HORIZONTAL, length=300, mode='determinate')
-progress.pack(pady=20)
-
-total_images = tk.IntVar()
-processed_images = tk.IntVar()
-progress_label = tk.Label(app, textvariable=tk.StringVar(value="Processed: 0 / 0"), font=("Arial", 12))
-progress_label.pack(pady=10)
-
-def update_progress_label(*args):
-    progress_label['text'] = f"Processed: {processed_images.get()} / {total_images.get()}"
-    progress['maximum'] = total_images.get()
-    progress['value'] = processed_images.get()
-
-total_images.trace_add("write", update_progress_label)
-processed_images.trace_add("write", update_progress_label)
-
-result_label = tk.Label(app, text="")
-result_label.pack(pady=20)
-
-app.mainloop()
\ No newline at end of file
+        stats_panel.watch(stats, 'done', total_images.get)
+        # Tk variables are read here on the main thread, never inside the workers
+        fast_decode = FAST_DECODE_MIN_SIDE if fast_decode_var.get() else 0
+        threading.Thread(target=process_images, args=(file_paths, selected_algorithms(), backend_var.get(),
+                                                      int(thread_entry.get()), int(chunk_entry.get()), fast_decode,
+                                                      cache_var.get(), folder_path, full_path_var.get(),
+                                                      batched_var.get(), stats)).start()
+
+def check_decode_drift():
+    # 抽样比较快速解码与完整解码的哈希差异, 按算法决定是否接受
+    file_paths = ask_file_paths()[0]
+    if isinstance(file_paths, DirectoryScanner):
+        # 只做一次短扫描: 取到足够的样本后立即停止扫描线程
+        scanner = file_paths
+        file_paths = list(islice(scanner, DRIFT_SAMPLE))
+        scanner.close()
+    else:
+        file_paths = list(file_paths[:DRIFT_SAMPLE])
+    if file_paths:
+        result_label.config(text="正在比较...")
+        threading.Thread(target=report_decode_drift, args=(file_paths, selected_algorithms())).start()
+
+def report_decode_drift(file_paths, algorithms):
+    report = decode_drift(file_paths, algorithms)
+    lines = [f"{name}: {stats['changed']}/{stats['files']} 变化, 平均 {stats['mean']:.2f} 位, 最大 {stats['max']} 位"
+             for name, stats in report.items()]
+    app.after(0, lambda: result_label.config(text="\n".join(lines)))
+
+def selected_algorithms():
+    selected = {'Average Hash': ahash_var.get(), 'Perceptual Hash': phash_var.get(), 'Difference Hash': dhash_var.get(),
+                'Wavelet Hash': whash_var.get(), 'Color Hash': colorhash_var.get()}
+    return [name for name in ALGORITHMS if selected[name]]
+
+def process_images(file_paths, algorithms, backend, workers, chunk_size, fast_decode, use_cache, folder_path, full_path,
+                   batched=False, stats=None):
+    stats = stats if stats is not None else Stats()
+    cache = None
+    if use_cache:
+        # 只计算新增或修改过的文件, 并清除已删除文件的缓存
+        cache = HashCache()
+        if folder_path:
+            cache.evict_missing(folder_path)
+    # 结果追加到hashes.csv, 同样的结果也存入二进制哈希库, 供查看器直接内存映射读取
+    try:
+        hash_images(file_paths, algorithms, 'hashes.csv', 'hashes.hashstore', full_path=full_path, cache=cache,
+                    stats=stats, progress=lambda processed: app.after(0, update_counts, processed, file_paths),
+                    backend=backend, workers=workers, chunk_size=chunk_size, fast_decode=fast_decode, batched=batched)
+    finally:
+        if cache is not None:
+            cache.close()
+    stats.dump(PROFILE_PATH, backend=backend, workers=workers, chunk_size=chunk_size, batched=batched,
+               fast_decode=fast_decode, algorithms=algorithms)
+    app.after(0, stats_panel.stop)
+    app.after(0, lambda: result_label.config(text=f"哈希值已保存到hashes.csv和hashes.hashstore, 耗时统计见{PROFILE_PATH}"))
+
+# 子进程会重新导入本模块, 界面只在主程序中创建
+if __name__ == "__main__":
+    app = tk.Tk()
+    app.title("ImageHash GUI")
+
+    select_button = tk.Button(app, text="选择图片/文件夹", command=select_images_or_folder)
+    select_button.pack(pady=20)
+
+    folder_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(app, text="选择文件夹", variable=folder_var).pack(anchor=tk.W)
+
+    ahash_var = tk.BooleanVar(value=True)
+    phash_var = tk.BooleanVar(value=True)
+    dhash_var = tk.BooleanVar(value=True)
+    whash_var = tk.BooleanVar(value=True)
+    colorhash_var = tk.BooleanVar(value=True)
+
+    tk.Checkbutton(app, text="Average Hash", variable=ahash_var).pack(anchor=tk.W)
+    tk.Checkbutton(app, text="Perceptual Hash", variable=phash_var).pack(anchor=tk.W)
+    tk.Checkbutton(app, text="Difference Hash", variable=dhash_var).pack(anchor=tk.W)
+    tk.Checkbutton(app, text="Wavelet Hash", variable=whash_var).pack(anchor=tk.W)
+    tk.Checkbutton(app, text="Color Hash", variable=colorhash_var).pack(anchor=tk.W)
+
+    thread_label = tk.Label(app, text="线程/进程数:")
+    thread_label.pack(pady=5, anchor=tk.W)
+    thread_entry = tk.Entry(app)
+    thread_entry.pack(pady=5, anchor=tk.W, padx=20)
+    thread_entry.insert(0, str(os.cpu_count() or 4))
+
+    # 进程池绕过GIL, 适合CPU密集的哈希计算
+    backend_var = tk.StringVar(value="process")
+    tk.Radiobutton(app, text="多进程", variable=backend_var, value="process").pack(anchor=tk.W)
+    tk.Radiobutton(app, text="多线程", variable=backend_var, value="thread").pack(anchor=tk.W)
+
+    chunk_label = tk.Label(app, text="每批文件数:")
+    chunk_label.pack(pady=5, anchor=tk.W)
+    chunk_entry = tk.Entry(app)
+    chunk_entry.pack(pady=5, anchor=tk.W, padx=20)
+    chunk_entry.insert(0, "32")
+
+    # 按缩小的尺寸解码 (JPEG用draft模式), 哈希可能有少量偏差
+    fast_decode_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(app, text="快速解码", variable=fast_decode_var).pack(anchor=tk.W)
+    # 每批图片的哈希用NumPy一次算完, 批越大单张开销越小
+    batched_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(app, text="批量哈希 (NumPy)", variable=batched_var).pack(anchor=tk.W)
+    cache_var = tk.BooleanVar(value=True)
+    tk.Checkbutton(app, text="使用哈希缓存", variable=cache_var).pack(anchor=tk.W)
+    full_path_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(app, text="保存完整路径", variable=full_path_var).pack(anchor=tk.W)
+    drift_button = tk.Button(app, text="检查快速解码偏差", command=check_decode_drift)
+    drift_button.pack(pady=5, anchor=tk.W)
+
+    progress = ttk.Progressbar(app, orient=tk.HORIZONTAL, length=300, mode='determinate')
+    progress.pack(pady=20)
+
+    total_images = tk.IntVar()
+    processed_images = tk.IntVar()
+    progress_label = tk.Label(app, textvariable=tk.StringVar(value="Processed: 0 / 0"), font=("Arial", 12))
+    progress_label.pack(pady=10)
+
+    # 实时统计: 每秒处理的图片数, 预计剩余时间和各阶段耗时
+    stats_panel = StatsPanel(app)
+    stats_panel.pack(pady=5, padx=10, fill=tk.X)
+
+    def update_progress_label(*args):
+        progress_label['text'] = f"Processed: {processed_images.get()} / {total_images.get()}"
+        progress['maximum'] = max(total_images.get(), 1)
+        progress['value'] = processed_images.get()
+
+    def update_counts(processed, file_paths):
+        # 扫描文件夹时总数随发现的文件增长
+        if isinstance(file_paths, DirectoryScanner):
+            total_images.set(file_paths.found)
+            if not file_paths.finished:
+                result_label.config(text=f"扫描中... 已发现 {file_paths.found} 个文件, 已计算 {processed} 个")
+        processed_images.set(processed)
+
+    total_images.trace_add("write", update_progress_label)
+    processed_images.trace_add("write", update_progress_label)
+
+    result_label = tk.Label(app, text="")
+    result_label.pack(pady=20)
+
+    app.mainloop()
\ No newline at end of file
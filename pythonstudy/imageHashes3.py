@@ -1,11 +1,17 @@
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
-import csv
 import os
 import threading
-from datetime import datetime
-import imagehash
-from PIL import Image
+import time
+from hashengine import FAST_DECODE_MIN_SIDE, decode_drift
+from hashcache import HashCache
+from hashjobs import hash_file_list, write_file_list
+from scanner import DirectoryScanner
+from stats import Stats
+from statspanel import StatsPanel
+
+# 检查快速解码偏差时最多抽取的文件数
+DRIFT_SAMPLE = 50
 
 # 选择文件或文件夹
 def select_file_or_directory():
@@ -17,24 +23,37 @@ def select_file_or_directory():
     else:
         folder_path = filedialog.askdirectory()
         if folder_path:
-            # 选择文件夹下的所有图片文件
-            import os
-            for root, dirs, filenames in os.walk(folder_path):
-                for filename in filenames:
-                    if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')):
-                        files.append(os.path.join(root, filename))
+            # 清除缓存中该文件夹下已删除文件的记录
+            cache = HashCache()
+            cache.evict_missing(folder_path)
+            cache.close()
+            # 在后台并行扫描文件夹下的所有图片文件, 扫描完成后再保存
+            compute_button.config(state=tk.DISABLED)
+            scanner = DirectoryScanner(folder_path, ('.png', '.jpg', '.jpeg', '.bmp', '.tiff'))
+            threading.Thread(target=scan_folder, args=(scanner,)).start()
+            return
     
     # 保存文件名到CSV
     save_to_csv(files)
 
+def scan_folder(scanner):
+    last_update = 0.0
+    for file_path in scanner:
+        files.append(file_path)
+        if time.monotonic() - last_update > 0.1:
+            last_update = time.monotonic()
+            root.after(0, lambda found=scanner.found: progress_label.config(text=f"Found: {found}"))
+    root.after(0, finish_scan)
+
+def finish_scan():
+    save_to_csv(files)
+    progress_label.config(text=f"Found: {len(files)}")
+    compute_button.config(state=tk.NORMAL)
+
 # 将文件名保存到CSV
 def save_to_csv(files):
     global csv_filename
-    csv_filename = datetime.now().strftime('%Y%m%d%H%M%S') + ".csv"
-    with open(csv_filename, 'w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        for file_path in files:
-            writer.writerow([file_path])
+    csv_filename = write_file_list(files)
 
 # 主窗口
 root = tk.Tk()
@@ -64,28 +83,18 @@ progress_label.pack(pady=10)
 progress_bar = ttk.Progressbar(root, orient="horizontal", length=200, mode="determinate", variable=processed_files, maximum=100) # maximum will be updated later
 progress_bar.pack(pady=20)
 
-# 处理单个图片的哈希值
-def process_image(file_path, results, hash_methods):
-    try:
-        image = Image.open(file_path)
-        hash_values = []
-
-        # 根据用户选择来计算哈希值
-        if "dHash" in hash_methods:
-            hash_values.append(str(imagehash.dhash(image)))
-        if "pHash" in hash_methods:
-            hash_values.append(str(imagehash.phash(image)))
-        if "wHash" in hash_methods:
-            hash_values.append(str(imagehash.whash(image)))
-        if "ColorHash" in hash_methods:
-            hash_values.append(str(imagehash.colorhash(image)))
-        if "Average Hash" in hash_methods:
-            hash_values.append(str(imagehash.average_hash(image)))
-
-        results[file_path] = hash_values
+# 实时统计: 每秒处理的图片数, 预计剩余时间和流水线各阶段耗时
+stats_panel = StatsPanel(root)
+stats_panel.pack(pady=5, padx=10, fill=tk.X)
 
-    except Exception as e:
-        print(f"Error processing {file_path}: {e}")
+# 界面上的哈希方法名 -> hashengine中的算法名
+HASH_METHODS = {
+    "dHash": "Difference Hash",
+    "pHash": "Perceptual Hash",
+    "wHash": "Wavelet Hash",
+    "ColorHash": "Color Hash",
+    "Average Hash": "Average Hash",
+}
 
 # 哈希方法的复选框
 dhash_var = tk.BooleanVar()
@@ -108,13 +117,32 @@ average_hash_var = tk.BooleanVar()
 average_hash_cb = tk.Checkbutton(root, text="Average Hash", variable=average_hash_var)
 average_hash_cb.pack(pady=5)
 
-
-# 计算图片的哈希值（多线程版本）
-def compute_hash_multithreaded():
-    num_threads = int(threads_var.get())
+# 快速解码: 按缩小的尺寸解码图片, 哈希可能有少量偏差
+fast_decode_var = tk.BooleanVar()
+fast_decode_cb = tk.Checkbutton(root, text="快速解码", variable=fast_decode_var)
+fast_decode_cb.pack(pady=5)
+
+# 启用快速解码之前, 先抽样比较快速解码与完整解码的哈希差异
+def check_decode_drift():
+    file_paths = files[:DRIFT_SAMPLE]
+    if file_paths:
+        drift_label.config(text="正在比较...")
+        threading.Thread(target=report_decode_drift, args=(file_paths, selected_algorithms())).start()
+
+def report_decode_drift(file_paths, algorithms):
+    report = decode_drift(file_paths, algorithms)
+    lines = [f"{name}: {stats['changed']}/{stats['files']} 变化, 平均 {stats['mean']:.2f} 位, 最大 {stats['max']} 位"
+             for name, stats in report.items()]
+    root.after(0, lambda: drift_label.config(text="\n".join(lines)))
+
+drift_button = tk.Button(root, text="检查快速解码偏差", command=check_decode_drift)
+drift_button.pack(pady=5)
+drift_label = tk.Label(root, text="")
+drift_label.pack(pady=5)
+
+# 收集用户选择的哈希方法, 按HASH_METHODS的顺序
+def selected_algorithms():
     hash_methods = []
-
-    # 收集用户选择的哈希方法
     if dhash_var.get():
         hash_methods.append("dHash")
     if phash_var.get():
@@ -125,31 +153,45 @@ def compute_hash_multithreaded():
         hash_methods.append("ColorHash")
     if average_hash_var.get():
         hash_methods.append("Average Hash")
+    return [HASH_METHODS[method] for method in HASH_METHODS if method in hash_methods]
 
-    # 读取之前生成的CSV文件中的图片文件
-    with open(csv_filename, 'r', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        files_from_csv = [row[0] for row in reader]
-
-    # 创建一个字典来保存结果
-    results = {}
-
-    # 创建并启动线程
-    threads = []
-    for file_path in files_from_csv:
-        thread = threading.Thread(target=process_image, args=(file_path, results, hash_methods))
-        threads.append(thread)
-        thread.start()
 
-    # 等待所有线程完成
-    for thread in threads:
-        thread.join()
-
-    # 更新CSV文件
-    with open(csv_filename, 'w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        for file_path, hash_values in results.items():
-            writer.writerow([file_path] + hash_values)
+# 计算图片的哈希值（流水线版本: 枚举 -> 解码 -> 哈希 -> 写入, 各阶段之间用有界队列连接）
+def compute_hash_multithreaded():
+    num_threads = int(threads_var.get())
+    decode_threads = int(decode_threads_var.get())
+    fast_decode = FAST_DECODE_MIN_SIDE if fast_decode_var.get() else 0
+    algorithms = selected_algorithms()
+    processed_files.set(0)
+    stats = Stats()
+    stats_panel.watch(stats, 'done', total_files.get)
+    threading.Thread(target=run_hash_pipeline, args=(csv_filename, algorithms, fast_decode,
+                                                      decode_threads, num_threads, stats)).start()
+
+def run_hash_pipeline(csv_path, algorithms, fast_decode, decode_threads, hash_threads, stats):
+    # 枚举 -> 解码 -> 哈希 -> 写入, 哈希值写回原CSV, 同时写一份二进制哈希库 (与CSV同名, 扩展名为.hashstore)
+    # 未改动的文件直接从缓存读取, 只计算新增或修改过的文件
+    cache = HashCache()
+    try:
+        hash_file_list(csv_path, algorithms, fast_decode, decode_threads, hash_threads, cache=cache, stats=stats,
+                       progress=lambda done, found: root.after(0, update_progress, done, found))
+    except Exception as e:
+        # 出错时原CSV保持不变
+        root.after(0, stats_panel.stop)
+        root.after(0, lambda: messagebox.showerror("Compute Hash", f"{csv_path}: {e}"))
+        return
+    finally:
+        cache.close()
+    # 每次运行结束后把各阶段耗时写到CSV旁边的JSON文件
+    stats.dump(csv_path + ".profile.json", algorithms=algorithms, fast_decode=fast_decode,
+               decode_threads=decode_threads, hash_threads=hash_threads)
+    root.after(0, stats_panel.stop)
+
+def update_progress(done, found):
+    total_files.set(found)
+    processed_files.set(done)
+    progress_bar.config(maximum=max(found, 1))
+    progress_label.config(text=f"Processed: {done}/{found}")
 
 # 推荐的线程数（通常为CPU核心数）
 recommended_threads = os.cpu_count()
@@ -158,11 +200,18 @@ recommended_threads = os.cpu_count()
 
 # 输入框供用户选择线程数
 threads_var = tk.StringVar(value=str(recommended_threads))
-threads_label = tk.Label(root, text="选择线程数 (推荐值: {})".format(recommended_threads))
+threads_label = tk.Label(root, text="哈希线程数 (推荐值: {})".format(recommended_threads))
 threads_label.pack(pady=10)
 threads_entry = tk.Entry(root, textvariable=threads_var)
 threads_entry.pack(pady=10)
 
+# 解码阶段的线程数
+decode_threads_var = tk.StringVar(value=str(max(1, recommended_threads // 2)))
+decode_threads_label = tk.Label(root, text="解码线程数")
+decode_threads_label.pack(pady=10)
+decode_threads_entry = tk.Entry(root, textvariable=decode_threads_var)
+decode_threads_entry.pack(pady=10)
+
 # 创建一个按钮来开始计算哈希值
 compute_button = tk.Button(root, text="Compute Hash", command=compute_hash_multithreaded)
 compute_button.pack(pady=20)
@@ -0,0 +1,35 @@
+import datetime
+import os
+
+from PIL import Image
+
+# Treeview columns filled from the file itself rather than from the CSV
+METADATA_COLUMNS = ("Type", "Dimensions", "Size", "Creation Time", "Modification Time")
+
+# Shown for files that cannot be read, so they are not retried on every scroll
+UNREADABLE = ("?", "", "", "", "")
+
+
+def _timestamp(seconds):
+    return datetime.datetime.fromtimestamp(seconds).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def image_metadata(image_path, cache):
+    """Display values for METADATA_COLUMNS; only new or changed files are opened"""
+    try:
+        st = os.stat(image_path)
+        stat = (st.st_size, st.st_mtime_ns)
+        info = cache.get_info(image_path, stat)
+        if info is None:
+            with Image.open(image_path) as img:
+                info = (img.format, img.width, img.height, img.mode)
+            cache.put_info(image_path, info, stat)
+    except OSError as e:
+        print(f"Error reading {image_path}: {e}")
+        return UNREADABLE
+    image_format, width, height, mode = info
+    return (image_format,
+            f"{width}x{height} {mode}",
+            f"{st.st_size} bytes",
+            _timestamp(st.st_ctime),
+            _timestamp(st.st_mtime))
@@ -1,7 +1,12 @@
 import tkinter as tk
 from tkinter import ttk, filedialog
 import csv
+import queue
 import threading
+from csvstream import read_batches
+
+# How often the main loop picks up progress from the loading thread
+POLL_MS = 200
 
 class CSVLoader(tk.Tk):
     def __init__(self):
@@ -21,28 +26,62 @@ class CSVLoader(tk.Tk):
         # Progressbar
         self.progress = ttk.Progressbar(self, orient="horizontal", length=300, mode="determinate")
         self.progress.pack(pady=20)
+
+        # Parsed rows; the worker only appends whole batches
+        self.rows = []
+        self.progress_queue = queue.Queue()
         
     def open_csv_file(self):
         file_path = filedialog.askopenfilename(title="Select a CSV file", filetypes=(("CSV files", "*.csv"), ("All files", "*.*")))
         if file_path:
             self.csv_file = file_path
-            self.total_lines = sum(1 for line in open(file_path))
-            # Start the loading thread
-            self.thread = threading.Thread(target=self.load_csv)
+            self.rows = []
+            self.open_button.config(state=tk.DISABLED)
+            # Start the loading thread; it never touches Tk, the main loop polls its progress
+            self.thread = threading.Thread(target=self.load_csv, daemon=True)
             self.thread.start()
+            self.after(POLL_MS, self.poll_progress)
         
     def load_csv(self):
-        with open(self.csv_file, "r") as file:
-            csv_reader = csv.reader(file)
-            for index, row in enumerate(csv_reader):
-                # Update the GUI
-                self.update_progress(index + 1)
+        try:
+            for rows, bytes_done, bytes_total in read_batches(self.csv_file):
+                self.rows.extend(rows)
+                self.progress_queue.put((len(self.rows), bytes_done, bytes_total))
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
+            self.progress_queue.put(e)
+        finally:
+            # Always sent, so the button comes back and polling stops whatever happened
+            self.progress_queue.put(None)
+
+    def poll_progress(self):
+        # Only the latest update matters; anything older is skipped
+        latest, error, finished = None, None, False
+        while True:
+            try:
+                item = self.progress_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                finished = True
+            elif isinstance(item, Exception):
+                error = item
+            else:
+                latest = item
+        if latest is not None:
+            self.update_progress(*latest)
+        # The error goes last so a progress update from the same poll cannot hide it
+        if error is not None:
+            self.state_label.config(text=f"Error: {error}")
+        if finished:
+            self.open_button.config(state=tk.NORMAL)
+        else:
+            self.after(POLL_MS, self.poll_progress)
                 
-    def update_progress(self, current_line):
-        self.state_label.config(text=f"Loaded {current_line}/{self.total_lines} lines")
-        self.progress['value'] = (current_line / self.total_lines) * 100
-        self.update_idletasks()
+    def update_progress(self, current_line, bytes_done, bytes_total):
+        self.state_label.config(text=f"Loaded {current_line} lines ({bytes_done / 2**20:.1f}/{bytes_total / 2**20:.1f} MB)")
+        self.progress['value'] = (bytes_done / max(1, bytes_total)) * 100
 
-# Test
-app = CSVLoader()
-app.mainloop()
\ No newline at end of file
+if __name__ == "__main__":
+    # Test
+    app = CSVLoader()
+    app.mainloop()
\ No newline at end of file
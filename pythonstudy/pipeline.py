@@ -0,0 +1,127 @@
+import queue
+import threading
+import time
+from stats import NO_STATS
+
+_DONE = object()
+# How often blocked threads look at the stop flag
+_POLL = 0.1
+
+
+class Stage:
+    """One pipeline step: func(item) -> item for the next step, or None to drop it"""
+
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+
+
+def _put(out_queue, item, stop):
+    # put that gives up once the pipeline is stopped; False when the item was not queued
+    while not stop.is_set():
+        try:
+            out_queue.put(item, timeout=_POLL)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(in_queue, stop):
+    # get that returns the end marker once the pipeline is stopped
+    while not stop.is_set():
+        try:
+            return in_queue.get(timeout=_POLL)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def _feed(source, out_queue, failure, stop):
+    # An error in source is kept for run_pipeline to raise; the end marker is still sent
+    # so the stages finish what they already have
+    try:
+        for item in source:
+            if not _put(out_queue, item, stop):
+                return
+    except Exception as e:
+        failure.append(e)
+    finally:
+        _put(out_queue, _DONE, stop)
+
+
+def _work(stage, in_queue, out_queue, finished, stats, stop):
+    while True:
+        item = _get(in_queue, stop)
+        if stop.is_set():
+            return
+        if item is _DONE:
+            # Let the sibling workers see the end marker too; the last one passes it on
+            _put(in_queue, _DONE, stop)
+            with finished['lock']:
+                finished['count'] += 1
+                last = finished['count'] == stage.workers
+            if last:
+                _put(out_queue, _DONE, stop)
+            return
+        start = time.perf_counter()
+        try:
+            result = stage.func(item)
+        except Exception as e:
+            print(f"Error in stage {stage.name}: {e}")
+            continue
+        finally:
+            stats.record('stage.' + stage.name, time.perf_counter() - start)
+        if result is not None and not _put(out_queue, result, stop):
+            return
+
+
+def run_pipeline(source, stages, sink, queue_size=16, stats=NO_STATS):
+    """Stream items from source through the stages into sink(item).
+
+    Stages are joined by bounded queues of queue_size items, so however long
+    source is, at most about queue_size items (plus one per worker) are in
+    flight per stage. sink runs on the calling thread, one item at a time.
+    Returns the number of items that reached the sink. If source raises,
+    the same exception is raised here once the items already read are done,
+    so a cut-short run never looks finished. If sink raises, every thread is
+    stopped and the queued items are dropped before the exception is
+    passed on. Every stage call is timed as
+    'stage.<name>' and every sink call as 'stage.sink' in stats.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    failure = []
+    stop = threading.Event()
+    threads = [threading.Thread(target=_feed, args=(source, queues[0], failure, stop), daemon=True)]
+    for i, stage in enumerate(stages):
+        finished = {'lock': threading.Lock(), 'count': 0}
+        for _ in range(stage.workers):
+            threads.append(threading.Thread(target=_work, args=(stage, queues[i], queues[i + 1], finished, stats, stop),
+                                            daemon=True))
+    for thread in threads:
+        thread.start()
+
+    completed = 0
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is _DONE:
+                break
+            with stats.timer('stage.sink'):
+                sink(item)
+            completed += 1
+    except BaseException:
+        # Unblock every thread, then drop what is still queued (decoded images included)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        for q in queues:
+            while not q.empty():
+                q.get_nowait()
+        raise
+    for thread in threads:
+        thread.join()
+    if failure:
+        raise failure[0]
+    return completed
@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PreviewLoader:
+    """Decode previews on a worker pool and hand them to the Tk thread.
+
+    Each display slot (e.g. one preview label) has at most one live request:
+    a new request for the slot cancels the old one if it has not started,
+    and a result that arrives after the slot has moved on is dropped.
+    Prefetches warm the thumbnail cache for rows the user is likely to step
+    to next; they are cancelled as soon as the selection moves again.
+    """
+
+    def __init__(self, root, cache, box, workers=2):
+        self.root = root
+        self.cache = cache
+        self.box = box
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.current = {}
+        self.prefetching = []
+
+    def request(self, slot, image_path, callback):
+        """Load image_path for slot and call callback(pil_image) on the Tk thread"""
+        self.cancel_prefetch()
+        previous = self.current.get(slot)
+        if previous is not None:
+            previous.cancel()
+        future = self.executor.submit(self.cache.get, image_path, self.box)
+        self.current[slot] = future
+        future.add_done_callback(lambda f: self._done(slot, f, image_path, callback))
+
+    def _done(self, slot, future, image_path, callback):
+        # Runs on a worker thread; Tk is only touched from the main loop
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            print(f"Error loading preview {image_path}: {error}")
+            return
+        self.root.after(0, self._deliver, slot, future, callback)
+
+    def _deliver(self, slot, future, callback):
+        if self.current.get(slot) is future:
+            del self.current[slot]
+            callback(future.result())
+
+    def cancel(self, slot):
+        """Forget slot's pending request, e.g. when its widget is rebound to another row"""
+        future = self.current.pop(slot, None)
+        if future is not None:
+            future.cancel()
+
+    def prefetch(self, image_paths):
+        """Queue image_paths behind any pending request, dropping the previous prefetch batch"""
+        self.cancel_prefetch()
+        self.prefetching = [self.executor.submit(self._warm, image_path) for image_path in image_paths]
+
+    def _warm(self, image_path):
+        try:
+            self.cache.get(image_path, self.box)
+        except Exception:
+            pass
+
+    def cancel_prefetch(self):
+        for future in self.prefetching:
+            future.cancel()
+        self.prefetching = []
+
+    def shutdown(self):
+        self.cancel_prefetch()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,12 +1,7 @@
 import os
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-import hashlib
-
-def get_md5(filename):
-    """计算文件的MD5值"""
-    with open(filename, 'rb') as f:
-        return hashlib.md5(f.read()).hexdigest()
+from dedup import find_duplicates, list_files
 
 def rename_files(directory, progress_var):
     """重命名文件"""
@@ -27,33 +22,32 @@ def rename_files(directory, progress_var):
             renamed_files += 1
         progress_var.set(renamed_files / len(files) * 100)
 
-def remove_duplicates(directory, skip_confirmation, progress_var):
-    """删除重复文件"""
-    files = [f for f in os.listdir(directory) if os.path.isfile(os.path.join(directory, f))]
-    seen_hashes = set()
-    duplicates_removed = 0
+def remove_duplicates(directory, skip_confirmation, progress_var, recursive=False):
+    """删除重复文件 (先按大小分组, 再比较首尾块哈希, 最后只对仍然相同的文件计算完整哈希)"""
+    files = list_files(directory, recursive)
 
-    for file in files:
-        filepath = os.path.join(directory, file)
-        file_hash = get_md5(filepath)
+    def update_progress(done, total):
+        progress_var.set(done / total * 100)
+        root.update_idletasks()
 
-        if file_hash in seen_hashes:
+    duplicates_removed = 0
+    for group in find_duplicates(files, progress=update_progress):
+        # 每组保留第一个文件
+        for filepath in group[1:]:
             if not skip_confirmation:
-                if not messagebox.askyesno("确认", f"是否删除重复文件 {file}?"):
+                if not messagebox.askyesno("确认", f"是否删除重复文件 {os.path.relpath(filepath, directory)}?"):
                     continue
             os.remove(filepath)
             duplicates_removed += 1
-        else:
-            seen_hashes.add(file_hash)
-        progress_var.set(duplicates_removed / len(files) * 100)
+    progress_var.set(100)
 
-def browse_directory(skip_confirmation_var, rename_progress_var, duplicate_progress_var):
+def browse_directory(skip_confirmation_var, rename_progress_var, duplicate_progress_var, recursive_var):
     """选择目录并执行重命名和删除操作"""
     directory = filedialog.askdirectory()
     if not directory:
         return
     rename_files(directory, rename_progress_var)
-    remove_duplicates(directory, skip_confirmation_var.get(), duplicate_progress_var)
+    remove_duplicates(directory, skip_confirmation_var.get(), duplicate_progress_var, recursive_var.get())
 
 # 创建GUI界面
 root = tk.Tk()
@@ -69,7 +63,11 @@ skip_confirmation_var = tk.BooleanVar()
 skip_confirmation_check = tk.Checkbutton(frame, text="删除重复文件时跳过确认", variable=skip_confirmation_var)
 skip_confirmation_check.pack(pady=10)
 
-browse_btn = tk.Button(frame, text="选择目录", command=lambda: browse_directory(skip_confirmation_var, rename_progress_var, duplicate_progress_var))
+recursive_var = tk.BooleanVar()
+recursive_check = tk.Checkbutton(frame, text="包含子文件夹中的重复文件", variable=recursive_var)
+recursive_check.pack(pady=10)
+
+browse_btn = tk.Button(frame, text="选择目录", command=lambda: browse_directory(skip_confirmation_var, rename_progress_var, duplicate_progress_var, recursive_var))
 browse_btn.pack(pady=10)
 
 rename_progress_var = tk.DoubleVar()
@@ -0,0 +1,126 @@
+import os
+import queue
+import threading
+import time
+from stats import NO_STATS
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff', '.tif')
+
+_DONE = object()
+
+
+class DirectoryScanner:
+    """Walk folder trees with os.scandir on several threads, yielding image paths as they are found.
+
+    Extensions are checked on the entry name (extensions=None accepts every
+    file) and directories are told apart with DirEntry.is_dir, which on most
+    platforms needs no extra stat call.
+    Iterate over the scanner to receive paths; `found` and `scanned_dirs`
+    count progress so far and `finished` turns True once the walk is done.
+    Call close() when stopping early, so the worker threads do not stay
+    blocked on a full path queue.
+    Listing each directory is timed as 'scan.dir' in stats.
+    """
+
+    def __init__(self, roots, extensions=IMAGE_EXTENSIONS, workers=8, max_pending=10000, stats=NO_STATS):
+        if isinstance(roots, str):
+            roots = [roots]
+        self.roots = list(roots)
+        self.extensions = tuple(ext.lower() for ext in extensions) if extensions is not None else None
+        self.workers = max(1, workers)
+        self.stats = stats
+        self.found = 0
+        self.scanned_dirs = 0
+        self.finished = False
+        self._dirs = queue.Queue()
+        self._paths = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._outstanding = 0
+        self._started = False
+        self._stop = threading.Event()
+        self._threads = []
+
+    def _add_dir(self, path):
+        with self._lock:
+            self._outstanding += 1
+        self._dirs.put(path)
+
+    def _work(self):
+        while True:
+            path = self._dirs.get()
+            if path is _DONE or self._stop.is_set():
+                return
+            start = time.perf_counter()
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if self._stop.is_set():
+                            break
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                self._add_dir(entry.path)
+                            elif ((self.extensions is None or entry.name.lower().endswith(self.extensions))
+                                  and entry.is_file()):
+                                with self._lock:
+                                    self.found += 1
+                                self._paths.put(entry.path)
+                        except OSError:
+                            continue
+            except OSError as e:
+                print(f"Error scanning {path}: {e}")
+            # Time spent waiting on a full path queue is included: that is the consumer's backpressure
+            self.stats.record('scan.dir', time.perf_counter() - start)
+            with self._lock:
+                self.scanned_dirs += 1
+                self._outstanding -= 1
+                last = self._outstanding == 0
+            if last:
+                # Nothing left to scan anywhere: stop the workers and the consumer
+                for _ in range(self.workers):
+                    self._dirs.put(_DONE)
+                self._paths.put(_DONE)
+
+    def start(self):
+        if self._started:
+            return self
+        self._started = True
+        if not self.roots:
+            self._paths.put(_DONE)
+            return self
+        for root in self.roots:
+            self._add_dir(root)
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def close(self):
+        """Stop the walk early: wake and join the workers, dropping the paths not yet consumed"""
+        self._stop.set()
+        for _ in range(self.workers):
+            self._dirs.put(_DONE)
+        # Workers blocked on a full path queue get room to finish their put and see the stop flag
+        while any(thread.is_alive() for thread in self._threads):
+            try:
+                self._paths.get(timeout=0.05)
+            except queue.Empty:
+                pass
+        while not self._paths.empty():
+            self._paths.get_nowait()
+        self._paths.put(_DONE)
+        self.finished = True
+
+    def __iter__(self):
+        self.start()
+        while True:
+            path = self._paths.get()
+            if path is _DONE:
+                self.finished = True
+                return
+            yield path
+
+
+def scan_images(roots, extensions=IMAGE_EXTENSIONS, workers=8):
+    """Generator of image paths under roots, found by a parallel scandir walk"""
+    return iter(DirectoryScanner(roots, extensions, workers))
@@ -0,0 +1,116 @@
+import numpy as np
+
+# Short terms have too few trigrams to narrow anything down; they scan the byte blob instead
+TRIGRAM = 3
+
+
+def _sorted_unique(values):
+    # np.unique sorts too, but is much slower than sort + neighbour compare on large arrays
+    values = np.sort(values)
+    if values.size:
+        values = values[np.concatenate(([True], values[1:] != values[:-1]))]
+    return values
+
+
+class SearchIndex:
+    """Substring search over image paths and prefix search over hash columns.
+
+    Paths are lowercased and joined into one UTF-8 blob. A trigram index maps
+    every 3-byte sequence to the sorted rows containing it, so a term only has
+    to be checked against the rows that contain all of its trigrams. Each
+    hash column keeps its values sorted, so a hex prefix is a binary search.
+    All results are sorted row numbers.
+    """
+
+    def __init__(self, paths, hash_columns=()):
+        self.paths = [str(path).lower() for path in paths]
+        encoded = [path.encode('utf-8') for path in self.paths]
+        lengths = np.array([len(path) for path in encoded], dtype=np.int64)
+        self.starts = np.concatenate(([0], np.cumsum(lengths + 1)[:-1])).astype(np.int64)
+        # NUL separators keep trigrams and matches from spanning two paths
+        self.blob = np.frombuffer(b'\0'.join(encoded), dtype=np.uint8)
+        self._build_trigrams(lengths)
+
+        self.hash_sorted = []
+        self.hash_rows = []
+        for values in hash_columns:
+            values = np.array([str(v).strip().lower() for v in values], dtype=str)
+            order = np.argsort(values, kind='stable')
+            self.hash_sorted.append(values[order])
+            self.hash_rows.append(order)
+
+    def _build_trigrams(self, lengths):
+        b = self.blob
+        if b.size < TRIGRAM:
+            self.trigrams = np.zeros(0, dtype=np.uint32)
+            self.trigram_starts = np.zeros(1, dtype=np.int64)
+            self.trigram_rows = np.zeros(0, dtype=np.uint32)
+            return
+        codes = (b[:-2].astype(np.uint32) << 16) | (b[1:-1].astype(np.uint32) << 8) | b[2:]
+        rows = np.repeat(np.arange(len(lengths), dtype=np.uint64), lengths + 1)[:codes.size]
+        keep = (b[:-2] != 0) & (b[1:-1] != 0) & (b[2:] != 0)
+        # One (trigram, row) pair per distinct trigram in a row, grouped by trigram
+        keys = _sorted_unique((codes[keep].astype(np.uint64) << np.uint64(32)) | rows[keep])
+        codes = (keys >> np.uint64(32)).astype(np.uint32)
+        self.trigram_rows = (keys & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+        boundaries = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+        self.trigrams = codes[boundaries]
+        self.trigram_starts = np.concatenate((boundaries, [codes.size])).astype(np.int64)
+
+    def _posting(self, code):
+        i = np.searchsorted(self.trigrams, code)
+        if i == self.trigrams.size or self.trigrams[i] != code:
+            return np.zeros(0, dtype=np.uint32)
+        return self.trigram_rows[self.trigram_starts[i]:self.trigram_starts[i + 1]]
+
+    def _scan(self, term):
+        # Byte-level match positions for short terms, mapped back to their rows
+        b = self.blob
+        n = len(term)
+        if b.size < n:
+            return np.zeros(0, dtype=np.int64)
+        hit = b[:b.size - n + 1] == term[0]
+        for j in range(1, n):
+            hit &= b[j:b.size - n + 1 + j] == term[j]
+        # Any hit inside a row's span (path plus its separator) marks the row
+        starts = self.starts[self.starts < hit.size]
+        return np.flatnonzero(np.logical_or.reduceat(hit, starts)).astype(np.int64)
+
+    def search_paths(self, term):
+        """Rows whose path contains term, ignoring case"""
+        term = term.lower()
+        encoded = term.encode('utf-8')
+        if not encoded:
+            return np.zeros(0, dtype=np.int64)
+        if len(encoded) < TRIGRAM:
+            return self._scan(encoded)
+        codes = {(encoded[i] << 16) | (encoded[i + 1] << 8) | encoded[i + 2] for i in range(len(encoded) - 2)}
+        postings = sorted((self._posting(code) for code in codes), key=len)
+        candidates = postings[0]
+        for posting in postings[1:]:
+            if candidates.size == 0:
+                break
+            candidates = np.intersect1d(candidates, posting, assume_unique=True)
+        if len(encoded) == TRIGRAM:
+            return candidates.astype(np.int64)
+        # Having every trigram does not mean they are adjacent, so confirm
+        return np.array([row for row in candidates.tolist() if term in self.paths[row]], dtype=np.int64)
+
+    def search_hash(self, column, prefix):
+        """Rows whose hash in column starts with the hex prefix"""
+        prefix = prefix.strip().lower()
+        values = self.hash_sorted[column]
+        lo = np.searchsorted(values, prefix, side='left')
+        # 'g' sorts after every hex digit
+        hi = np.searchsorted(values, prefix + 'g', side='left')
+        return np.sort(self.hash_rows[column][lo:hi]).astype(np.int64)
+
+    def search(self, term):
+        """Rows matching term as a path substring or as a prefix of any hash column"""
+        term = term.strip()
+        if not term:
+            return np.zeros(0, dtype=np.int64)
+        results = [self.search_paths(term)]
+        if all(c in '0123456789abcdefABCDEF' for c in term):
+            results += [self.search_hash(c, term) for c in range(len(self.hash_sorted))]
+        return _sorted_unique(np.concatenate(results))
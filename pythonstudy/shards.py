@@ -0,0 +1,204 @@
+import csv
+import hashlib
+import heapq
+import json
+import os
+import shutil
+import tempfile
+from itertools import islice
+
+# Sharded hashing: split a file list into partitions by path hash, hash each
+# partition anywhere (another process, another machine), then merge the
+# outputs with an external sort so memory stays bounded however large the
+# archive is.
+
+MANIFEST_SUFFIX = ".shards.json"
+# Rows sorted in memory at a time while merging; each sorted run is spilled to a temporary file
+RUN_ROWS = 200000
+# Sorted runs merged at once; with more runs than this the merge takes extra passes
+FAN_IN = 64
+
+
+def shard_of(path, shards):
+    """Partition of a path: blake2b of its UTF-8 bytes, so every machine and Python version agrees"""
+    digest = hashlib.blake2b(path.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shards
+
+
+def shard_path(list_path, index, shards):
+    return f"{os.path.splitext(list_path)[0]}.shard-{index:05d}-of-{shards:05d}.csv"
+
+
+def manifest_path_for(list_path):
+    return os.path.splitext(list_path)[0] + MANIFEST_SUFFIX
+
+
+def split_file_list(list_path, shards, algorithms, fast_decode=0, manifest_path=None):
+    """Split a one-column file list (as imageHashes3 saves it) into shard lists and write their manifest.
+
+    Each path goes to shard_of(path, shards), so the same path always lands
+    in the same shard. The manifest records the algorithms and decode mode
+    every shard must be hashed with, and each shard's file and row count,
+    relative to the manifest so the folder can be copied between machines.
+    Returns the manifest path.
+    """
+    manifest_path = manifest_path or manifest_path_for(list_path)
+    paths = [shard_path(list_path, i, shards) for i in range(shards)]
+    counts = [0] * shards
+    files = [open(path, 'w', newline='', encoding='utf-8') for path in paths]
+    try:
+        writers = [csv.writer(f) for f in files]
+        with open(list_path, 'r', newline='', encoding='utf-8') as source:
+            for row in csv.reader(source):
+                if not row:
+                    continue
+                shard = shard_of(row[0], shards)
+                writers[shard].writerow(row[:1])
+                counts[shard] += 1
+    finally:
+        for f in files:
+            f.close()
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    manifest = {
+        'source': os.path.relpath(os.path.abspath(list_path), base),
+        'rows': sum(counts),
+        'partition': 'blake2b-64(utf-8 path) mod shards',
+        'algorithms': list(algorithms),
+        'fast_decode': fast_decode,
+        'shards': [{'index': i, 'list': os.path.relpath(os.path.abspath(path), base), 'rows': count}
+                   for i, (path, count) in enumerate(zip(paths, counts))],
+    }
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest_path
+
+
+def load_manifest(manifest_path):
+    """Manifest dict with every shard's 'list' turned into a usable path"""
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    for shard in manifest['shards']:
+        shard['list'] = os.path.join(base, shard['list'])
+    return manifest
+
+
+def hash_shard(manifest_path, index, decode_threads=4, hash_threads=4, cache=None, stats=None, progress=None):
+    """Hash one shard in place with the manifest's settings, as hashjobs.hash_file_list does for a whole list"""
+    from hashjobs import hash_file_list
+    manifest = load_manifest(manifest_path)
+    shard = manifest['shards'][index]
+    return hash_file_list(shard['list'], manifest['algorithms'], manifest['fast_decode'], decode_threads,
+                          hash_threads, cache=cache, stats=stats, progress=progress)
+
+
+def _read_rows(path, width):
+    # Hashed rows of one input; a header row (first cell 'Image', as in hashes.csv) is skipped
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        for n, row in enumerate(reader):
+            if not row or (n == 0 and row[0] == 'Image'):
+                continue
+            if len(row) != width:
+                raise ValueError(f"{path} line {n + 1}: expected {width} columns, got {len(row)}; "
+                                 f"has it been hashed?")
+            yield row
+
+
+def _write_run(rows, folder, number):
+    path = os.path.join(folder, f"run-{number:06d}.csv")
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(rows)
+    return path
+
+
+def _read_run(path):
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        yield from csv.reader(f)
+
+
+def _sorted_runs(inputs, width, folder, run_rows):
+    """Spill every input as sorted runs of at most run_rows rows; returns the run paths"""
+    runs = []
+    for path in inputs:
+        rows = _read_rows(path, width)
+        while True:
+            chunk = list(islice(rows, run_rows))
+            if not chunk:
+                break
+            chunk.sort()
+            runs.append(_write_run(chunk, folder, len(runs)))
+    return runs
+
+
+def _merge_passes(runs, folder, fan_in):
+    # Merge groups of fan_in runs until one heapq.merge over the rest can finish the job
+    number = len(runs)
+    while len(runs) > fan_in:
+        merged = []
+        for start in range(0, len(runs), fan_in):
+            group = runs[start:start + fan_in]
+            merged.append(_write_run(heapq.merge(*(_read_run(p) for p in group)), folder, number))
+            number += 1
+            for path in group:
+                os.remove(path)
+        runs = merged
+    return runs
+
+
+def merge_hash_files(inputs, output_path, algorithms, store_path=None, run_rows=RUN_ROWS, fan_in=FAN_IN,
+                     temp_dir=None):
+    """Merge hashed lists into one, sorted by path with one row per path, in bounded memory.
+
+    inputs are CSVs of path then one hex column per algorithm (shard lists
+    after hashing, or hashes.csv-style files with a header). Rows are sorted
+    in runs of run_rows and spilled to temp_dir, then merged; a path that
+    appears more than once keeps its smallest row, so the result does not
+    depend on how rows were split. The output has no row-order noise from
+    worker threads, so merging a single unsharded run gives byte for byte
+    the same CSV and store as merging any sharding of it. The store (by
+    default beside output_path) is skipped when store_path is False.
+    Returns the number of rows written.
+    """
+    from hashengine import HEX_WIDTH
+    from hashstore import HashStoreWriter, store_path_for
+    algorithms = list(algorithms)
+    width = 1 + len(algorithms)
+    if store_path is None:
+        store_path = store_path_for(output_path)
+    store = HashStoreWriter(store_path, algorithms, [HEX_WIDTH[name] for name in algorithms]) if store_path else None
+    folder = tempfile.mkdtemp(prefix="hashmerge-", dir=temp_dir)
+    written = 0
+    try:
+        runs = _merge_passes(_sorted_runs(inputs, width, folder, run_rows), folder, fan_in)
+        previous = None
+        with open(output_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            for row in heapq.merge(*(_read_run(path) for path in runs)):
+                if row[0] == previous:
+                    continue
+                previous = row[0]
+                writer.writerow(row)
+                if store is not None:
+                    store.append(row[0], {name: int(value, 16) for name, value in zip(algorithms, row[1:]) if value})
+                written += 1
+        if store is not None:
+            store.close()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return written
+
+
+def merge_shards(manifest_path, output_path, **options):
+    """merge_hash_files over every shard of a manifest; returns (rows written, rows missing).
+
+    Rows missing are list entries that produced no row: files that could not
+    be decoded, which a single run leaves out too, and repeated paths.
+    """
+    manifest = load_manifest(manifest_path)
+    missing = [shard['index'] for shard in manifest['shards'] if not os.path.exists(shard['list'])]
+    if missing:
+        raise FileNotFoundError(f"Shard files missing for shard(s) {missing}")
+    written = merge_hash_files([shard['list'] for shard in manifest['shards']], output_path,
+                               manifest['algorithms'], **options)
+    return written, manifest['rows'] - written
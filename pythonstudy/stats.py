@@ -0,0 +1,154 @@
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Latency histograms use power-of-two microsecond buckets: bucket b holds [2**(b-1), 2**b) us
+BUCKETS = 40
+
+
+def _bucket(seconds):
+    return min(BUCKETS - 1, int(seconds * 1e6).bit_length())
+
+
+class Stats:
+    """Counters and latency histograms for named stages, cheap enough to leave on.
+
+    A record is one lock, a few additions and a bit_length, so per-image
+    stages cost well under a microsecond of bookkeeping each. Worker processes
+    keep their own Stats and send export() back to be merged.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.last_count = self.started
+        self.counters = {}
+        # name -> [count, total seconds, max seconds, histogram]
+        self.timings = {}
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+            self.last_count = time.perf_counter()
+
+    def record(self, name, seconds):
+        with self.lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                timing = self.timings[name] = [0, 0.0, 0.0, [0] * BUCKETS]
+            timing[0] += 1
+            timing[1] += seconds
+            if seconds > timing[2]:
+                timing[2] = seconds
+            timing[3][_bucket(seconds)] += 1
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def export(self):
+        with self.lock:
+            return {'counters': dict(self.counters),
+                    'timings': {name: [t[0], t[1], t[2], list(t[3])] for name, t in self.timings.items()}}
+
+    def merge(self, exported):
+        with self.lock:
+            for name, n in exported['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + n
+            self.last_count = time.perf_counter()
+            for name, (count, total, longest, histogram) in exported['timings'].items():
+                timing = self.timings.get(name)
+                if timing is None:
+                    timing = self.timings[name] = [0, 0.0, 0.0, [0] * BUCKETS]
+                timing[0] += count
+                timing[1] += total
+                timing[2] = max(timing[2], longest)
+                timing[3] = [a + b for a, b in zip(timing[3], histogram)]
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def rate(self, counter):
+        """counter per second, between creation and the last count, so it holds still once a run ends"""
+        return self.counters.get(counter, 0) / max(1e-9, self.last_count - self.started)
+
+    def eta(self, counter, total):
+        """Seconds left until counter reaches total at the current rate, or None"""
+        rate = self.rate(counter)
+        if not total or rate <= 0:
+            return None
+        return max(0.0, (total - self.counters.get(counter, 0)) / rate)
+
+    def snapshot(self):
+        """Counters plus count, total, mean and percentiles per stage.
+
+        Percentiles are the upper edge of their histogram bucket, so they are
+        accurate to within a factor of two, which is enough to spot outliers.
+        """
+        exported = self.export()
+        stages = {}
+        for name, (count, total, longest, histogram) in exported['timings'].items():
+            stages[name] = {'count': count, 'total_s': total, 'mean_ms': 1000 * total / max(1, count),
+                            'max_ms': 1000 * longest,
+                            'p50_ms': min(1000 * longest, _percentile(histogram, count, 0.5)),
+                            'p90_ms': min(1000 * longest, _percentile(histogram, count, 0.9)),
+                            'p99_ms': min(1000 * longest, _percentile(histogram, count, 0.99))}
+        return {'elapsed_s': self.elapsed(), 'counters': exported['counters'], 'stages': stages}
+
+    def summary(self, counter=None, total=None, unit="images"):
+        """A few lines of text for a live stats panel"""
+        snapshot = self.snapshot()
+        lines = []
+        if counter is not None:
+            line = f"{snapshot['counters'].get(counter, 0)} {unit}, {self.rate(counter):.1f} {unit}/s"
+            eta = self.eta(counter, total)
+            if eta is not None:
+                line += f", ETA {int(eta) // 60}:{int(eta) % 60:02d}"
+            lines.append(line)
+        # Stages that took the most time first
+        stages = sorted(snapshot['stages'].items(), key=lambda item: -item[1]['total_s'])
+        for name, stage in stages:
+            lines.append(f"{name:<22} {stage['count']:>8} x {stage['mean_ms']:8.2f} ms"
+                         f"  p90 {stage['p90_ms']:8.2f} ms  total {stage['total_s']:7.1f} s")
+        return "\n".join(lines)
+
+    def dump(self, path, **extra):
+        """Write snapshot() plus any extra fields as a JSON profile"""
+        profile = dict(self.snapshot(), **extra)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(profile, f, indent=2)
+        return path
+
+
+def _percentile(histogram, count, fraction):
+    # Upper edge of the bucket holding the requested rank, in milliseconds
+    if not count:
+        return 0.0
+    rank = fraction * count
+    seen = 0
+    for bucket, n in enumerate(histogram):
+        seen += n
+        if seen >= rank:
+            return (1 << bucket) / 1000
+    return (1 << (len(histogram) - 1)) / 1000
+
+
+class NoStats(Stats):
+    """Stats that records nothing, for callers that did not ask for instrumentation"""
+
+    def count(self, name, n=1):
+        pass
+
+    def record(self, name, seconds):
+        pass
+
+    def timer(self, name):
+        return nullcontext()
+
+
+NO_STATS = NoStats()
@@ -0,0 +1,50 @@
+import tkinter as tk
+
+# Refresh interval of the panel; summary() is cheap, but there is no point redrawing faster than this
+REFRESH_MS = 500
+# Stages shown, slowest first
+MAX_STAGES = 8
+
+
+class StatsPanel(tk.Label):
+    """Label that shows a Stats object live: throughput, ETA and the slowest stages.
+
+    watch(stats, counter, total) starts following a run; total is a number or
+    a function returning the current total, for runs whose size grows while
+    they go (folder scans). stop() leaves the last figures on screen.
+    """
+
+    def __init__(self, master, unit="images", **options):
+        options.setdefault('font', ("Courier", 9))
+        options.setdefault('justify', tk.LEFT)
+        options.setdefault('anchor', tk.W)
+        super().__init__(master, text="", **options)
+        self.unit = unit
+        self.stats = None
+        self.counter = None
+        self.total = None
+        self.job = None
+
+    def watch(self, stats, counter="images", total=None):
+        self.stats = stats
+        self.counter = counter
+        self.total = total
+        if self.job is None:
+            self.refresh()
+
+    def stop(self):
+        if self.job is not None:
+            self.after_cancel(self.job)
+            self.job = None
+        self.show()
+
+    def show(self):
+        if self.stats is None:
+            return
+        total = self.total() if callable(self.total) else self.total
+        lines = self.stats.summary(self.counter, total, self.unit).split("\n")
+        self.config(text="\n".join(lines[:MAX_STAGES + 1]))
+
+    def refresh(self):
+        self.show()
+        self.job = self.after(REFRESH_MS, self.refresh)
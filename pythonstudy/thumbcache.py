@@ -0,0 +1,100 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from fastdecode import open_preview
+
+# Shared by both viewers, next to the hash cache
+DEFAULT_THUMB_DIR = os.path.join(os.path.expanduser('~'), '.imagehash_thumbs')
+
+# Decoded thumbnails kept in memory, counted as width * height * bands bytes
+DEFAULT_MEMORY_BYTES = 256 * 1024 * 1024
+
+
+def _image_bytes(img):
+    return img.width * img.height * len(img.getbands())
+
+
+class ThumbnailCache:
+    """Two-tier cache of preview-sized images: an in-memory LRU over an on-disk directory.
+
+    Disk entries are named by a digest of the absolute path and the preview
+    box, and carry the source file's mtime (set with os.utime); an entry whose
+    mtime no longer matches the source is stale and is rebuilt. Memory
+    entries are evicted least recently used first once max_bytes is exceeded.
+    get() is thread-safe and returns PIL images; turn them into PhotoImages
+    on the Tk thread.
+    """
+
+    def __init__(self, folder=DEFAULT_THUMB_DIR, max_bytes=DEFAULT_MEMORY_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+        os.makedirs(folder, exist_ok=True)
+
+    def _disk_path(self, key):
+        # Keyed by path on purpose, as hashcache is: a lookup costs one stat, where a
+        # content digest would read every file on each memory miss (slow on network
+        # folders) only to share thumbnails between copies. Edits are caught by the
+        # mtime stamp, and an edited file overwrites its own slot rather than adding one.
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.folder, digest[:2], digest + '.png')
+
+    def _remember(self, key, img):
+        with self.lock:
+            old = self.memory.pop(key, None)
+            if old is not None:
+                self.used_bytes -= old[1]
+            size = _image_bytes(img)
+            self.memory[key] = (img, size)
+            self.used_bytes += size
+            while self.used_bytes > self.max_bytes and len(self.memory) > 1:
+                _, (_, evicted) = self.memory.popitem(last=False)
+                self.used_bytes -= evicted
+
+    def _load_disk(self, thumb_path, mtime_ns):
+        try:
+            if os.stat(thumb_path).st_mtime_ns != mtime_ns:
+                return None
+            img = Image.open(thumb_path)
+            img.load()
+            return img
+        except OSError:
+            return None
+
+    def _save_disk(self, thumb_path, img, mtime_ns):
+        try:
+            os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+            temp_path = f"{thumb_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            img.save(temp_path, 'PNG', compress_level=1)
+            os.utime(temp_path, ns=(mtime_ns, mtime_ns))
+            os.replace(temp_path, thumb_path)
+        except OSError as e:
+            print(f"Error saving thumbnail for {thumb_path}: {e}")
+
+    def get(self, image_path, box):
+        """Preview of image_path resized to fit box, from memory, disk, or a fresh decode"""
+        image_path = os.path.abspath(image_path)
+        mtime_ns = os.stat(image_path).st_mtime_ns
+        key = (image_path, tuple(box), mtime_ns)
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.memory.move_to_end(key)
+                return entry[0]
+
+        # The mtime is not part of the file name, so an edited image reuses its slot
+        thumb_path = self._disk_path(key[:2])
+        img = self._load_disk(thumb_path, mtime_ns)
+        if img is None:
+            img = open_preview(image_path, box)
+            if img.mode not in ('1', 'L', 'LA', 'P', 'RGB', 'RGBA'):
+                img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+            self._save_disk(thumb_path, img, mtime_ns)
+        self._remember(key, img)
+        return img
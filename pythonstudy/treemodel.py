@@ -0,0 +1,104 @@
+import datetime
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _size_key(value):
+    # "1234 bytes"
+    try:
+        return int(value.split()[0])
+    except (ValueError, IndexError):
+        return -1
+
+
+def _pixels_key(value):
+    # "1920x1080 RGB"
+    try:
+        width, height = value.split()[0].split('x')
+        return int(width) * int(height)
+    except (ValueError, IndexError):
+        return -1
+
+
+def _time_key(value):
+    try:
+        return datetime.datetime.strptime(value, TIME_FORMAT)
+    except ValueError:
+        return datetime.datetime.min
+
+
+def _hash_key(value):
+    try:
+        return int(value, 16)
+    except ValueError:
+        return -1
+
+
+COLUMN_KEYS = {
+    "Size": _size_key,
+    "Dimensions": _pixels_key,
+    "Creation Time": _time_key,
+    "Modification Time": _time_key,
+}
+
+
+def column_key(column):
+    """Typed sort key for a Treeview column's display strings"""
+    if column in COLUMN_KEYS:
+        return COLUMN_KEYS[column]
+    if column.startswith("Hash") or column.endswith(" Hash"):
+        return _hash_key
+    return str
+
+
+class TreeModel:
+    """Python-side copy of a flat Treeview's rows, used to sort without reading cells back.
+
+    Sorting computes typed keys once per column and caches the resulting
+    item order in each direction until rows change. The new order is handed
+    to Tk in a single "children" call instead of one move per row.
+    """
+
+    def __init__(self, treeview, columns):
+        self.treeview = treeview
+        self.columns = list(columns)
+        self.rows = {}
+        self.orders = {}
+
+    def insert(self, values, iid=None, **options):
+        iid = self.treeview.insert("", "end", iid=iid, values=values, **options)
+        self.rows[iid] = list(values)
+        self.orders.clear()
+        return iid
+
+    def set(self, iid, column, value):
+        self.treeview.set(iid, column, value)
+        self.rows[iid][self.columns.index(column)] = value
+        self.orders.pop((column, False), None)
+        self.orders.pop((column, True), None)
+
+    def clear(self):
+        self.treeview.delete(*self.treeview.get_children())
+        self.rows = {}
+        self.orders.clear()
+
+    def order(self, column, reverse=False):
+        """Items sorted by column, ascending unless reverse; ties kept in insertion order either way"""
+        order = self.orders.get((column, reverse))
+        if order is None:
+            index = self.columns.index(column)
+            key = column_key(column)
+            keys = {iid: key(values[index]) for iid, values in self.rows.items()}
+            order = sorted(self.rows, key=keys.__getitem__, reverse=reverse)
+            self.orders[(column, reverse)] = order
+        return order
+
+    def sort(self, column, reverse=False):
+        order = self.order(column, reverse)
+        self.treeview.tk.call(self.treeview, "children", "", order)
+        # Keep the selected row in view, otherwise start from the top
+        selection = self.treeview.selection()
+        if selection:
+            self.treeview.see(selection[0])
+        else:
+            self.treeview.yview_moveto(0)